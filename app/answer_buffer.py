@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from .answers import insert_answers
+from .config import settings
+from .database import SessionLocal
+from .live_feed import publish_answers
+
+
+class AnswerBufferFull(Exception):
+    pass
+
+
+class AnswerWriteBuffer:
+    def __init__(
+        self,
+        max_size: int,
+        batch_size: int,
+        flush_interval_ms: int,
+        put_timeout_ms: int,
+        retry_attempts: int,
+        retry_backoff_ms: int,
+    ) -> None:
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.put_timeout = put_timeout_ms / 1000
+        self.retry_attempts = retry_attempts
+        self.retry_backoff = retry_backoff_ms / 1000
+        self._queue: queue.Queue[dict] = queue.Queue(maxsize=max_size)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.retries = 0
+        self.last_flush_ms = 0
+        self.max_flush_ms = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="answer-write-buffer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join()
+        self._thread = None
+        self._drain()
+
+    def put(self, row: dict, block: bool = True) -> None:
+        try:
+            self._queue.put(row, block=block, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise AnswerBufferFull from None
+        with self._lock:
+            self.enqueued += 1
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._take(self.flush_interval)
+            if batch:
+                self._flush_safely(batch)
+
+    def _take(self, wait: float) -> list[dict]:
+        deadline = time.monotonic() + wait
+        batch: list[dict] = []
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self) -> None:
+        while True:
+            batch = self._take(0)
+            if not batch:
+                return
+            self._flush_safely(batch)
+
+    def _flush_safely(self, rows: list[dict]) -> None:
+        # The flusher must outlive any single batch: if it died, answers that
+        # students were already told were graded would pile up unwritten.
+        try:
+            self._flush(rows)
+        except Exception:
+            with self._lock:
+                self.dropped += len(rows)
+                self.flushes += 1
+
+    def _flush(self, rows: list[dict]) -> None:
+        started = time.monotonic()
+        written = self._write_with_retry(rows)
+        if written is None:
+            # A question removed between grading and flushing fails the whole
+            # statement; retry row by row so only the orphaned answers are lost.
+            written = sum(self._write_with_retry([row]) or 0 for row in rows)
+        elapsed_ms = int((time.monotonic() - started) * 1000)
+        with self._lock:
+            self.written += written
+            self.dropped += len(rows) - written
+            self.flushes += 1
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+
+    def _write_with_retry(self, rows: list[dict]) -> int | None:
+        """Write ``rows``, retrying transient database errors with exponential backoff.
+
+        Returns the number of rows written, ``None`` on an integrity error, and
+        0 once every attempt failed (the rows are counted as dropped).
+        """
+        backoff = self.retry_backoff
+        for attempt in range(self.retry_attempts + 1):
+            try:
+                return self._write(rows)
+            except SQLAlchemyError:
+                if attempt == self.retry_attempts:
+                    return 0
+                with self._lock:
+                    self.retries += 1
+                time.sleep(backoff)
+                backoff *= 2
+        return 0
+
+    def _write(self, rows: list[dict]) -> int | None:
+        db = SessionLocal()
+        try:
+            resposta_ids = insert_answers(db, rows)
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return None
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        publish_answers(resposta_ids, rows)
+        return len(rows)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "depth": self._queue.qsize(),
+                "max_size": self.max_size,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "rejected": self.rejected,
+                "flushes": self.flushes,
+                "retries": self.retries,
+                "last_flush_ms": self.last_flush_ms,
+                "max_flush_ms": self.max_flush_ms,
+            }
+
+
+answer_buffer = AnswerWriteBuffer(
+    max_size=settings.answer_buffer_size,
+    batch_size=settings.answer_buffer_batch_size,
+    flush_interval_ms=settings.answer_buffer_flush_interval_ms,
+    put_timeout_ms=settings.answer_buffer_put_timeout_ms,
+    retry_attempts=settings.answer_buffer_retry_attempts,
+    retry_backoff_ms=settings.answer_buffer_retry_backoff_ms,
+)
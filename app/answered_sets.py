@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from secrets import randbelow
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import Respondida
+
+
+class AnsweredSet:
+    __slots__ = ("_answered", "_wrong", "_wrong_positions")
+
+    def __init__(self) -> None:
+        self._answered = bytearray()
+        self._wrong: list[int] = []
+        self._wrong_positions: dict[int, int] = {}
+
+    def __contains__(self, question_id: int) -> bool:
+        byte = question_id >> 3
+        return byte < len(self._answered) and bool(self._answered[byte] & (1 << (question_id & 7)))
+
+    def bits(self) -> int:
+        return int.from_bytes(self._answered, "little")
+
+    def mark(self, question_id: int, correta: bool) -> None:
+        byte = question_id >> 3
+        if byte >= len(self._answered):
+            self._answered.extend(bytes(byte + 1 - len(self._answered)))
+        self._answered[byte] |= 1 << (question_id & 7)
+
+        if correta:
+            position = self._wrong_positions.pop(question_id, None)
+            if position is not None:
+                last = self._wrong.pop()
+                if position < len(self._wrong):
+                    self._wrong[position] = last
+                    self._wrong_positions[last] = position
+        elif question_id not in self._wrong_positions:
+            self._wrong_positions[question_id] = len(self._wrong)
+            self._wrong.append(question_id)
+
+    def random_wrong(self, accept: Callable[[int], bool] | None = None) -> int | None:
+        wrong = self._wrong
+        if not wrong:
+            return None
+        if accept is None:
+            return wrong[randbelow(len(wrong))]
+        start = randbelow(len(wrong))
+        for offset in range(len(wrong)):
+            question_id = wrong[(start + offset) % len(wrong)]
+            if accept(question_id):
+                return question_id
+        return None
+
+
+class AnsweredSetCache:
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._sets: OrderedDict[int, AnsweredSet] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, student_id: int) -> AnsweredSet:
+        with self._lock:
+            answered = self._sets.get(student_id)
+            if answered is not None:
+                self._sets.move_to_end(student_id)
+                return answered
+
+        answered = AnsweredSet()
+        rows = db.execute(
+            select(Respondida.question_id, Respondida.correta)
+            .where(Respondida.student_id == student_id)
+            .order_by(Respondida.id)
+        )
+        for question_id, correta in rows:
+            answered.mark(question_id, correta)
+
+        with self._lock:
+            current = self._sets.setdefault(student_id, answered)
+            self._sets.move_to_end(student_id)
+            while len(self._sets) > self.max_size:
+                self._sets.popitem(last=False)
+            return current
+
+    def record(self, student_id: int, question_id: int, correta: bool) -> None:
+        with self._lock:
+            answered = self._sets.get(student_id)
+            if answered is not None:
+                answered.mark(question_id, correta)
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._sets), "max_size": self.max_size}
+
+
+answered_sets = AnsweredSetCache(max_size=settings.answered_set_cache_size)
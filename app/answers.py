@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from datetime import datetime, timezone
+
+from sqlalchemy import Integer, cast, delete, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .models import Question, Respondida, StudentStats
+from .question_bank import question_index
+
+
+def lookup_answer_keys(db: Session, question_ids: Iterable[int]) -> dict[int, str | None]:
+    question_index.ensure_fresh(db)
+    keys: dict[int, str | None] = {}
+    unknown: list[int] = []
+    for question_id in set(question_ids):
+        exists, alternativa_correta = question_index.answer_key(question_id)
+        if exists:
+            keys[question_id] = alternativa_correta
+        else:
+            unknown.append(question_id)
+    if unknown:
+        rows = db.execute(select(Question.id, Question.alternativa_correta).where(Question.id.in_(unknown)))
+        for question_id, alternativa_correta in rows:
+            keys[question_id] = alternativa_correta
+    return keys
+
+
+def normalize_answered_at(answered_at: datetime | None) -> datetime:
+    now = datetime.utcnow()
+    if answered_at is None:
+        return now
+    if answered_at.tzinfo is not None:
+        answered_at = answered_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(answered_at, now)
+
+
+def insert_answers(db: Session, rows: list[dict]) -> list[int]:
+    result = db.execute(insert(Respondida).returning(Respondida.id, sort_by_parameter_order=True), rows)
+    resposta_ids = list(result.scalars())
+    update_student_stats(db, rows)
+    return resposta_ids
+
+
+def update_student_stats(db: Session, rows: list[dict]) -> None:
+    now = datetime.utcnow()
+    totals: dict[int, list] = {}
+    for row in rows:
+        answered_at = row.get("created_at") or now
+        entry = totals.setdefault(row["student_id"], [0, 0, answered_at])
+        entry[0] += 1
+        entry[1] += int(row["correta"])
+        entry[2] = max(entry[2], answered_at)
+
+    # Sorted so concurrent batches lock student_stats rows in the same order.
+    values = [
+        {"student_id": student_id, "total": total, "corretas": corretas, "last_answered_at": last_answered_at}
+        for student_id, (total, corretas, last_answered_at) in sorted(totals.items())
+    ]
+    if not values:
+        return
+    if db.get_bind().dialect.name == "sqlite":
+        stmt, latest = sqlite_insert(StudentStats).values(values), func.max
+    else:
+        stmt, latest = pg_insert(StudentStats).values(values), func.greatest
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[StudentStats.student_id],
+            set_={
+                "total": StudentStats.total + stmt.excluded.total,
+                "corretas": StudentStats.corretas + stmt.excluded.corretas,
+                "last_answered_at": latest(
+                    func.coalesce(StudentStats.last_answered_at, stmt.excluded.last_answered_at),
+                    stmt.excluded.last_answered_at,
+                ),
+            },
+        )
+    )
+
+
+def rebuild_student_stats(db: Session) -> int:
+    db.execute(delete(StudentStats))
+    aggregated = select(
+        Respondida.student_id,
+        func.count(Respondida.id),
+        func.coalesce(func.sum(cast(Respondida.correta, Integer)), 0),
+        func.max(Respondida.created_at),
+    ).group_by(Respondida.student_id)
+    result = db.execute(
+        insert(StudentStats).from_select(
+            ["student_id", "total", "corretas", "last_answered_at"],
+            aggregated,
+        )
+    )
+    return result.rowcount
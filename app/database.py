@@ -1,6 +1,9 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 
-from sqlalchemy import create_engine
+from sqlalchemy import Table, create_engine, inspect, make_url, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
 from .config import settings
@@ -10,6 +13,150 @@ engine = create_engine(settings.database_url, pool_pre_ping=True, future=True)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, class_=Session)
 Base = declarative_base()
 
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)).render_as_string(
+        hide_password=False
+    )
+
+
+# The async engine exists only in MENTORIA_DATABASE_MODE=async, so asyncpg or
+# aiosqlite is imported only when that mode is selected.
+async_engine = (
+    create_async_engine(async_database_url(settings.database_url), pool_pre_ping=True)
+    if settings.database_mode == "async"
+    else None
+)
+AsyncSessionLocal = (
+    async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False) if async_engine else None
+)
+
+ALTERNATIVE_TEXT_SQL = " || ' ' || ".join(
+    f'coalesce({{prefix}}"{column}", \'\')'
+    for column in ("alternativaA", "alternativaB", "alternativaC", "altenartivaD", "alternativaE")
+)
+
+# create_all only creates missing tables; columns, search structures and
+# triggers for existing tables are applied here, before the indexes declared
+# on the models are created. Postgres steps are keyed by the (table, column or
+# index) they add and run only when the catalog lacks it: even a no-op
+# ALTER TABLE takes an ACCESS EXCLUSIVE lock, which would queue every query
+# behind any long reader on each worker start. Indexes on live tables are
+# built CONCURRENTLY so they do not block writes.
+SCHEMA_UPGRADES: dict[str, list[tuple[str | None, str | None, list[str]]]] = {
+    "postgresql": [
+        (
+            "student_teacher_links",
+            "created_at",
+            ["ALTER TABLE student_teacher_links ADD COLUMN IF NOT EXISTS created_at TIMESTAMP NOT NULL DEFAULT now()"],
+        ),
+        (
+            "questions",
+            "search_vector",
+            [
+                "ALTER TABLE questions ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+                "setweight(to_tsvector('portuguese', coalesce(contexto, '')), 'A') || "
+                "setweight(to_tsvector('portuguese', coalesce(inducaoaalternativa, '')), 'B') || "
+                f"setweight(to_tsvector('portuguese', {ALTERNATIVE_TEXT_SQL.format(prefix='')}), 'C')"
+                ") STORED"
+            ],
+        ),
+        (
+            "questions",
+            "ix_questions_search_vector",
+            ["CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_questions_search_vector ON questions USING GIN (search_vector)"],
+        ),
+        # Inserting transaction of each row, for the snapshot cursor of
+        # /teachers/me/changes. Added without a default and then given one, so
+        # existing rows keep NULL (older than any cursor) and nothing is rewritten.
+        (
+            "respondidas",
+            "txid",
+            [
+                "ALTER TABLE respondidas ADD COLUMN IF NOT EXISTS txid xid8",
+                "ALTER TABLE respondidas ALTER COLUMN txid SET DEFAULT pg_current_xact_id()",
+            ],
+        ),
+        (
+            "respondidas",
+            "ix_respondidas_txid",
+            ["CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_respondidas_txid ON respondidas (txid)"],
+        ),
+        (
+            "student_teacher_links",
+            "txid",
+            [
+                "ALTER TABLE student_teacher_links ADD COLUMN IF NOT EXISTS txid xid8",
+                "ALTER TABLE student_teacher_links ALTER COLUMN txid SET DEFAULT pg_current_xact_id()",
+            ],
+        ),
+        (
+            "student_teacher_links",
+            "ix_student_teacher_links_txid",
+            [
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_student_teacher_links_txid "
+                "ON student_teacher_links (teacher_id, txid)"
+            ],
+        ),
+    ],
+    "sqlite": [
+        (
+            None,
+            None,
+            [
+                "CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(contexto, inducao, alternativas)",
+                "CREATE TRIGGER IF NOT EXISTS questions_fts_insert AFTER INSERT ON questions BEGIN "
+                "INSERT INTO questions_fts(rowid, contexto, inducao, alternativas) VALUES "
+                f"(new.id, new.contexto, new.inducaoaalternativa, {ALTERNATIVE_TEXT_SQL.format(prefix='new.')}); END",
+                "CREATE TRIGGER IF NOT EXISTS questions_fts_delete AFTER DELETE ON questions BEGIN "
+                "DELETE FROM questions_fts WHERE rowid = old.id; END",
+                "CREATE TRIGGER IF NOT EXISTS questions_fts_update AFTER UPDATE ON questions BEGIN "
+                "DELETE FROM questions_fts WHERE rowid = old.id; "
+                "INSERT INTO questions_fts(rowid, contexto, inducao, alternativas) VALUES "
+                f"(new.id, new.contexto, new.inducaoaalternativa, {ALTERNATIVE_TEXT_SQL.format(prefix='new.')}); END",
+                "INSERT INTO questions_fts(rowid, contexto, inducao, alternativas) "
+                f"SELECT id, contexto, inducaoaalternativa, {ALTERNATIVE_TEXT_SQL.format(prefix='')} FROM questions "
+                "WHERE id NOT IN (SELECT rowid FROM questions_fts)",
+            ],
+        ),
+    ],
+}
+
+
+def _present(table: str, name: str) -> bool:
+    inspector = inspect(engine)
+    return name in {column["name"] for column in inspector.get_columns(table)} or name in {
+        index["name"] for index in inspector.get_indexes(table)
+    }
+
+
+def upgrade_schema() -> None:
+    Base.metadata.create_all(bind=engine)
+    for table, name, statements in SCHEMA_UPGRADES.get(engine.dialect.name, []):
+        if table is not None and _present(table, name):
+            continue
+        if statements[0].startswith("CREATE INDEX CONCURRENTLY"):
+            # CONCURRENTLY cannot run inside a transaction block.
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                connection.execute(text(statements[0]))
+            continue
+        with engine.begin() as connection:
+            for statement in statements:
+                connection.execute(text(statement))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def dialect_insert(db: Session, target: type | Table):
+    """INSERT for the session's dialect, so writes can use ``on_conflict_*`` clauses."""
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite_insert(target)
+    return pg_insert(target)
+
 
 def get_db() -> Generator[Session, None, None]:
     db = SessionLocal()
@@ -17,3 +164,8 @@ def get_db() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -2,58 +2,186 @@ from datetime import datetime
 
 from fastapi import Depends, HTTPException, Security, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import Row, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from .database import get_db
+from .config import settings
+from .database import get_async_db, get_db
 from .models import Session as SessionModel
 from .models import Student, Teacher, UserType
-from .schemas import CurrentUser
+from .schemas import CurrentUser, StudentPrincipal, TeacherPrincipal
+from .session_cache import CachedSession, session_cache
+from .tokens import authenticate_signed_token
 
 http_bearer = HTTPBearer(auto_error=False)
 
 
+def _load_session(db: Session, token: str) -> CachedSession | None:
+    if settings.token_mode == "signed":
+        return authenticate_signed_token(db, token)
+
+    found, cached = session_cache.get(token)
+    if found:
+        return cached
+
+    row = db.query(SessionModel).filter(SessionModel.token == token).first()
+    if row is None:
+        session_cache.put_missing(token)
+        return None
+
+    cached = CachedSession(
+        token=row.token,
+        user_id=row.user_id,
+        user_type=row.user_type,
+        created_at=row.created_at,
+        expires_at=row.expires_at,
+    )
+    session_cache.put(cached)
+    return cached
+
+
 def get_current_session(
     credentials: HTTPAuthorizationCredentials | None = Security(http_bearer),
     db: Session = Depends(get_db),
-) -> SessionModel:
+) -> CachedSession:
     if credentials is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token ausente")
 
-    token = credentials.credentials
-    session = (
-        db.query(SessionModel)
-        .filter(SessionModel.token == token)
-        .order_by(SessionModel.created_at.desc())
-        .first()
-    )
+    session = _load_session(db, credentials.credentials)
     if session is None or session.expires_at < datetime.utcnow():
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido ou expirado")
     return session
 
 
-def get_current_user(session: SessionModel = Depends(get_current_session)) -> CurrentUser:
+def get_current_user(session: CachedSession = Depends(get_current_session)) -> CurrentUser:
     return CurrentUser(id=session.user_id, user_type=session.user_type)
 
 
-def get_current_teacher(
-    current_user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)
-) -> Teacher:
-    if current_user.user_type != UserType.TEACHER:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso restrito a professores")
+def _resolve_principal(
+    db: Session, token: str, model: type[Teacher] | type[Student], user_type: UserType, columns: tuple
+) -> tuple[CachedSession | None, Row | None]:
+    active_user = (model.id == SessionModel.user_id) & model.is_active.is_(True)
+
+    if settings.token_mode == "signed":
+        found, cached = True, authenticate_signed_token(db, token)
+    else:
+        found, cached = session_cache.get(token)
+    if found:
+        if cached is None or cached.user_type != user_type:
+            return cached, None
+        row = db.execute(select(*columns).where(model.id == cached.user_id, model.is_active.is_(True))).first()
+        return cached, row
+
+    row = db.execute(
+        select(
+            SessionModel.token,
+            SessionModel.user_id,
+            SessionModel.user_type,
+            SessionModel.created_at,
+            SessionModel.expires_at,
+            *columns,
+        )
+        .outerjoin(model, active_user & (SessionModel.user_type == user_type))
+        .where(SessionModel.token == token)
+    ).first()
+    if row is None:
+        session_cache.put_missing(token)
+        return None, None
+
+    cached = CachedSession(
+        token=row.token,
+        user_id=row.user_id,
+        user_type=row.user_type,
+        created_at=row.created_at,
+        expires_at=row.expires_at,
+    )
+    session_cache.put(cached)
+    return cached, row if row.id is not None else None
+
+
+def _require_principal(
+    credentials: HTTPAuthorizationCredentials | None,
+    db: Session,
+    model: type[Teacher] | type[Student],
+    user_type: UserType,
+    columns: tuple,
+    forbidden_detail: str,
+    missing_detail: str,
+) -> Row:
+    if credentials is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token ausente")
+
+    session, row = _resolve_principal(db, credentials.credentials, model, user_type, columns)
+    if session is None or session.expires_at < datetime.utcnow():
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido ou expirado")
+    if session.user_type != user_type:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=forbidden_detail)
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=missing_detail)
+    return row
+
 
-    teacher = db.query(Teacher).filter(Teacher.id == current_user.id, Teacher.is_active.is_(True)).first()
-    if teacher is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Professor não encontrado")
-    return teacher
+_TEACHER_COLUMNS = (Teacher.id, Teacher.name, Teacher.institution, Teacher.email, Teacher.tag)
+_STUDENT_COLUMNS = (Student.id, Student.name, Student.email)
+
+
+def get_current_teacher(
+    credentials: HTTPAuthorizationCredentials | None = Security(http_bearer),
+    db: Session = Depends(get_db),
+) -> TeacherPrincipal:
+    row = _require_principal(
+        credentials,
+        db,
+        Teacher,
+        UserType.TEACHER,
+        _TEACHER_COLUMNS,
+        forbidden_detail="Acesso restrito a professores",
+        missing_detail="Professor não encontrado",
+    )
+    return TeacherPrincipal(
+        id=row.id,
+        user_type=UserType.TEACHER,
+        name=row.name,
+        institution=row.institution,
+        email=row.email,
+        tag=row.tag,
+    )
 
 
 def get_current_student(
-    current_user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)
-) -> Student:
-    if current_user.user_type != UserType.STUDENT:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso restrito a estudantes")
-
-    student = db.query(Student).filter(Student.id == current_user.id, Student.is_active.is_(True)).first()
-    if student is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Aluno não encontrado")
-    return student
+    credentials: HTTPAuthorizationCredentials | None = Security(http_bearer),
+    db: Session = Depends(get_db),
+) -> StudentPrincipal:
+    row = _require_principal(
+        credentials,
+        db,
+        Student,
+        UserType.STUDENT,
+        _STUDENT_COLUMNS,
+        forbidden_detail="Acesso restrito a estudantes",
+        missing_detail="Aluno não encontrado",
+    )
+    return StudentPrincipal(id=row.id, user_type=UserType.STUDENT, name=row.name, email=row.email)
+
+
+async def get_current_teacher_async(
+    credentials: HTTPAuthorizationCredentials | None = Security(http_bearer),
+    db: AsyncSession = Depends(get_async_db),
+) -> TeacherPrincipal:
+    return await db.run_sync(lambda session: get_current_teacher(credentials, session))
+
+
+async def get_current_student_async(
+    credentials: HTTPAuthorizationCredentials | None = Security(http_bearer),
+    db: AsyncSession = Depends(get_async_db),
+) -> StudentPrincipal:
+    return await db.run_sync(lambda session: get_current_student(credentials, session))
+
+
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials | None = Security(http_bearer),
+    db: AsyncSession = Depends(get_async_db),
+) -> CurrentUser:
+    session = await db.run_sync(lambda sync_db: get_current_session(credentials, sync_db))
+    return get_current_user(session)
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import queue
+import select
+import threading
+from collections.abc import Iterable
+from datetime import datetime
+from typing import Protocol
+
+from .config import settings
+from .database import engine
+
+NOTIFY_CHANNEL = "mentoria_respondidas"
+
+
+class Subscription:
+    __slots__ = ("student_ids", "queue", "loop", "overflowed")
+
+    def __init__(self, student_ids: set[int], max_size: int, loop: asyncio.AbstractEventLoop) -> None:
+        self.student_ids = student_ids
+        self.queue: asyncio.Queue[dict | None] = asyncio.Queue(maxsize=max_size)
+        self.loop = loop
+        self.overflowed = False
+
+
+class AnswerHub:
+    def __init__(self, queue_size: int) -> None:
+        self.queue_size = queue_size
+        self._by_student: dict[int, set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self.subscribers = 0
+        self.dispatched = 0
+        self.dropped_subscribers = 0
+
+    def subscribe(self, student_ids: Iterable[int]) -> Subscription:
+        subscription = Subscription(set(student_ids), self.queue_size, asyncio.get_running_loop())
+        with self._lock:
+            for student_id in subscription.student_ids:
+                self._by_student.setdefault(student_id, set()).add(subscription)
+            self.subscribers += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            for student_id in subscription.student_ids:
+                subscribers = self._by_student.get(student_id)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._by_student[student_id]
+            self.subscribers -= 1
+
+    def dispatch(self, event: dict) -> None:
+        with self._lock:
+            subscriptions = list(self._by_student.get(event["student_id"], ()))
+            self.dispatched += 1
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(self._offer, subscription, event)
+            except RuntimeError:
+                continue
+
+    def _offer(self, subscription: Subscription, event: dict) -> None:
+        if subscription.overflowed:
+            return
+        try:
+            subscription.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow consumer: drop what it has not read and tell it to reconnect
+            # (and catch up through /teachers/me/changes) instead of buffering.
+            subscription.overflowed = True
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait(None)
+            with self._lock:
+                self.dropped_subscribers += 1
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "subscribers": self.subscribers,
+                "dispatched": self.dispatched,
+                "dropped_subscribers": self.dropped_subscribers,
+            }
+
+
+class Broker(Protocol):
+    def start(self) -> None: ...
+
+    def stop(self) -> None: ...
+
+    def publish(self, events: list[dict]) -> None: ...
+
+
+class MemoryBroker:
+    def __init__(self, hub: AnswerHub) -> None:
+        self.hub = hub
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def publish(self, events: list[dict]) -> None:
+        for event in events:
+            self.hub.dispatch(event)
+
+
+class PostgresBroker:
+    def __init__(self, hub: AnswerHub, channel: str = NOTIFY_CHANNEL) -> None:
+        self.hub = hub
+        self.channel = channel
+        self._publisher = None
+        self._outbox: queue.SimpleQueue[list[dict]] = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    @staticmethod
+    def _connect():
+        # Detached from the pool: these connections live as long as the process.
+        connection = engine.raw_connection()
+        connection.detach()
+        driver_connection = connection.driver_connection
+        driver_connection.autocommit = True
+        return driver_connection
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._listen, name="live-feed-listener", daemon=True),
+            threading.Thread(target=self._send, name="live-feed-publisher", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._publisher is not None:
+            self._publisher.close()
+            self._publisher = None
+
+    def publish(self, events: list[dict]) -> None:
+        # Handed to the publisher thread: callers may be on the event loop
+        # (MENTORIA_DATABASE_MODE=async) and must not wait on psycopg2.
+        self._outbox.put(events)
+
+    def _send(self) -> None:
+        while not self._stop.is_set() or not self._outbox.empty():
+            try:
+                events = self._outbox.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            # The feed is best effort: the answer is already committed, and clients
+            # catch up through /teachers/me/changes, so a broker failure is dropped.
+            try:
+                if self._publisher is None or self._publisher.closed:
+                    self._publisher = self._connect()
+                with self._publisher.cursor() as cursor:
+                    for event in events:
+                        cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, json.dumps(event)))
+            except Exception:
+                self._publisher = None
+
+    def _listen(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._listen_once()
+            except Exception:
+                self._stop.wait(1.0)
+
+    def _listen_once(self) -> None:
+        connection = self._connect()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.channel}")
+            while not self._stop.is_set():
+                if select.select([connection], [], [], 1.0) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    notify = connection.notifies.pop(0)
+                    self.hub.dispatch(json.loads(notify.payload))
+        finally:
+            connection.close()
+
+
+def answer_event(resposta_id: int, row: dict) -> dict:
+    created_at = row.get("created_at") or datetime.utcnow()
+    return {
+        "id": resposta_id,
+        "student_id": row["student_id"],
+        "question_id": row["question_id"],
+        "alternativa_escolhida": row["alternativa_escolhida"],
+        "correta": row["correta"],
+        "responded_at": created_at.isoformat(),
+    }
+
+
+def publish_answers(resposta_ids: Iterable[int], rows: Iterable[dict]) -> None:
+    if not answer_hub.subscribers and settings.live_feed_broker == "memory":
+        return
+    live_broker.publish([answer_event(resposta_id, row) for resposta_id, row in zip(resposta_ids, rows)])
+
+
+answer_hub = AnswerHub(queue_size=settings.live_feed_queue_size)
+live_broker: Broker = PostgresBroker(answer_hub) if settings.live_feed_broker == "postgres" else MemoryBroker(answer_hub)
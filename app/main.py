@@ -1,8 +1,16 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .database import Base, engine
-from .routers import auth, questions, students, teachers
+from .answer_buffer import answer_buffer
+from .answered_sets import answered_sets
+from .config import settings
+from .database import SessionLocal, upgrade_schema
+from .live_feed import answer_hub, live_broker
+from .pagination import NEXT_CURSOR_HEADER
+from .routers import auth, questions, questions_async, students, teachers
+from .question_bank import question_index, rendered_questions
+from .security import password_hasher
+from .session_cache import session_cache
 
 app = FastAPI(title="Mentoria API", version="0.1.0")
 
@@ -12,12 +20,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 
 @app.on_event("startup")
 def on_startup() -> None:
-    Base.metadata.create_all(bind=engine)
+    upgrade_schema()
+    with SessionLocal() as db:
+        question_index.ensure_fresh(db)
+    live_broker.start()
+    if settings.answer_write_mode == "buffered":
+        answer_buffer.start()
+
+
+@app.on_event("shutdown")
+def on_shutdown() -> None:
+    answer_buffer.stop()
+    live_broker.stop()
 
 
 @app.get("/health")
@@ -25,7 +45,20 @@ def healthcheck() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/health/metrics")
+def metrics() -> dict[str, dict[str, int]]:
+    return {
+        "session_cache": session_cache.stats(),
+        "question_index": question_index.stats(),
+        "rendered_questions": rendered_questions.stats(),
+        "answered_sets": answered_sets.stats(),
+        "answer_buffer": answer_buffer.stats(),
+        "live_feed": answer_hub.stats(),
+        "password_hasher": password_hasher.stats(),
+    }
+
+
 app.include_router(auth.router)
 app.include_router(teachers.router)
 app.include_router(students.router)
-app.include_router(questions.router)
+app.include_router(questions_async.router if settings.database_mode == "async" else questions.router)
@@ -8,13 +8,15 @@ from sqlalchemy import (
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     String,
     Table,
     Text,
     UniqueConstraint,
+    func,
 )
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, load_only, mapped_column, relationship, undefer_group
 
 from .config import settings
 from .database import Base
@@ -30,6 +32,7 @@ student_teacher_association = Table(
     Base.metadata,
     Column("student_id", ForeignKey("students.id", ondelete="CASCADE"), primary_key=True),
     Column("teacher_id", ForeignKey("teachers.id", ondelete="CASCADE"), primary_key=True),
+    Column("created_at", DateTime, server_default=func.now(), nullable=False),
     UniqueConstraint("student_id", "teacher_id", name="uq_student_teacher"),
 )
 
@@ -84,39 +87,78 @@ class Session(Base):
         return cls(token=token, user_id=user_id, user_type=user_type, expires_at=expiration)
 
 
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    jti: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+QUESTION_CONTENT = "content"
+
+
 class Question(Base):
     __tablename__ = "questions"
+    __table_args__ = (
+        Index("uq_questions_ano_index", "ano", "index", unique=True),
+        Index("ix_questions_ano_id", "ano", "id"),
+        Index("ix_questions_disciplina_id", "disciplina", "id"),
+        Index("ix_questions_linguagem_id", "linguagem", "id"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     titulo: Mapped[str] = mapped_column(String(512), nullable=False)
     index: Mapped[int] = mapped_column(Integer, nullable=False)
     ano: Mapped[int] = mapped_column(Integer, nullable=False)
     linguagem: Mapped[str | None] = mapped_column(String(64))
     disciplina: Mapped[str | None] = mapped_column(String(128))
-    contexto: Mapped[str | None] = mapped_column(Text)
-    aquivo1: Mapped[str | None] = mapped_column(String(512))
-    arquivo2: Mapped[str | None] = mapped_column(String(512))
-    arquivo3: Mapped[str | None] = mapped_column(String(512))
-    arquivo4: Mapped[str | None] = mapped_column(String(512))
-    arquivo5: Mapped[str | None] = mapped_column(String(512))
-    arquivo6: Mapped[str | None] = mapped_column(String(512))
-    arquivo7: Mapped[str | None] = mapped_column(String(512))
-    arquivo8: Mapped[str | None] = mapped_column(String(512))
-    arquivo9: Mapped[str | None] = mapped_column(String(512))
-    arquivo10: Mapped[str | None] = mapped_column(String(512))
+    contexto: Mapped[str | None] = mapped_column(Text, deferred=True, deferred_group=QUESTION_CONTENT)
+    aquivo1: Mapped[str | None] = mapped_column(String(512), deferred=True, deferred_group=QUESTION_CONTENT)
+    arquivo2: Mapped[str | None] = mapped_column(String(512), deferred=True, deferred_group=QUESTION_CONTENT)
+    arquivo3: Mapped[str | None] = mapped_column(String(512), deferred=True, deferred_group=QUESTION_CONTENT)
+    arquivo4: Mapped[str | None] = mapped_column(String(512), deferred=True, deferred_group=QUESTION_CONTENT)
+    arquivo5: Mapped[str | None] = mapped_column(String(512), deferred=True, deferred_group=QUESTION_CONTENT)
+    arquivo6: Mapped[str | None] = mapped_column(String(512), deferred=True, deferred_group=QUESTION_CONTENT)
+    arquivo7: Mapped[str | None] = mapped_column(String(512), deferred=True, deferred_group=QUESTION_CONTENT)
+    arquivo8: Mapped[str | None] = mapped_column(String(512), deferred=True, deferred_group=QUESTION_CONTENT)
+    arquivo9: Mapped[str | None] = mapped_column(String(512), deferred=True, deferred_group=QUESTION_CONTENT)
+    arquivo10: Mapped[str | None] = mapped_column(String(512), deferred=True, deferred_group=QUESTION_CONTENT)
     alternativa_correta: Mapped[str | None] = mapped_column(String(1))
-    inducaoaalternativa: Mapped[str | None] = mapped_column(Text)
-    alternativaA: Mapped[str | None] = mapped_column(Text)
-    alternativaB: Mapped[str | None] = mapped_column(Text)
-    alternativaC: Mapped[str | None] = mapped_column(Text)
-    altenartivaD: Mapped[str | None] = mapped_column(Text)
-    alternativaE: Mapped[str | None] = mapped_column(Text)
+    inducaoaalternativa: Mapped[str | None] = mapped_column(Text, deferred=True, deferred_group=QUESTION_CONTENT)
+    alternativaA: Mapped[str | None] = mapped_column(Text, deferred=True, deferred_group=QUESTION_CONTENT)
+    alternativaB: Mapped[str | None] = mapped_column(Text, deferred=True, deferred_group=QUESTION_CONTENT)
+    alternativaC: Mapped[str | None] = mapped_column(Text, deferred=True, deferred_group=QUESTION_CONTENT)
+    altenartivaD: Mapped[str | None] = mapped_column(Text, deferred=True, deferred_group=QUESTION_CONTENT)
+    alternativaE: Mapped[str | None] = mapped_column(Text, deferred=True, deferred_group=QUESTION_CONTENT)
     respostas: Mapped[list["Respondida"]] = relationship(
         "Respondida", back_populates="question", cascade="all, delete-orphan"
     )
 
 
+class QuestionImportManifest(Base):
+    __tablename__ = "question_import_manifest"
+
+    source: Mapped[str] = mapped_column(String(512), primary_key=True)
+    ano: Mapped[int] = mapped_column(Integer, nullable=False)
+    index: Mapped[int] = mapped_column(Integer, nullable=False)
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    imported_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class QuestionBankState(Base):
+    __tablename__ = "question_bank_state"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+    )
+
+
 class Respondida(Base):
     __tablename__ = "respondidas"
+    __table_args__ = (Index("ix_respondidas_student_created_id", "student_id", "created_at", "id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     student_id: Mapped[int] = mapped_column(
@@ -131,3 +173,25 @@ class Respondida(Base):
 
     student: Mapped["Student"] = relationship("Student", back_populates="respostas")
     question: Mapped["Question"] = relationship("Question", back_populates="respostas")
+
+
+class StudentStats(Base):
+    __tablename__ = "student_stats"
+
+    student_id: Mapped[int] = mapped_column(ForeignKey("students.id", ondelete="CASCADE"), primary_key=True)
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    corretas: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_answered_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+
+class TeacherTagCounter(Base):
+    __tablename__ = "teacher_tag_counters"
+
+    length: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    next_value: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+# Named load profiles for Question. The wide content columns are deferred,
+# so every ORM load picks one of these explicitly.
+QUESTION_SUMMARY = (load_only(Question.id, Question.titulo, Question.ano, Question.index, Question.disciplina),)
+QUESTION_FULL = (undefer_group(QUESTION_CONTENT),)
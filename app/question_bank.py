@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from secrets import randbelow
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .answered_sets import AnsweredSet
+from .models import Question, QuestionBankState
+
+BANK_STATE_ID = 1
+_MISSING = 0
+_NO_ANSWER_KEY = 1
+FILTER_COLUMNS = ("ano", "disciplina", "linguagem")
+BLOCK_BYTES = 512
+
+
+def _bitmap(question_ids: array) -> int:
+    bits = bytearray((question_ids[-1] >> 3) + 1 if question_ids else 0)
+    for question_id in question_ids:
+        bits[question_id >> 3] |= 1 << (question_id & 7)
+    return int.from_bytes(bits, "little")
+
+
+def _random_set_bit(bits: int) -> int | None:
+    """Uniformly random set bit of ``bits``, located through per-block popcounts."""
+    count = bits.bit_count()
+    if not count:
+        return None
+    n = randbelow(count)
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for start in range(0, len(data), BLOCK_BYTES):
+        block = int.from_bytes(data[start : start + BLOCK_BYTES], "little")
+        in_block = block.bit_count()
+        if n >= in_block:
+            n -= in_block
+            continue
+        offset, width = start * 8, BLOCK_BYTES * 8
+        while width > 1:
+            half = width // 2
+            low = block & ((1 << half) - 1)
+            in_low = low.bit_count()
+            if n < in_low:
+                block, width = low, half
+            else:
+                n -= in_low
+                block >>= half
+                offset += half
+                width -= half
+        return offset
+    return None
+
+
+def get_bank_version(db: Session) -> int:
+    version = db.execute(select(QuestionBankState.version).where(QuestionBankState.id == BANK_STATE_ID)).scalar()
+    return version or 0
+
+
+def bump_bank_version(db: Session) -> None:
+    result = db.execute(
+        update(QuestionBankState)
+        .where(QuestionBankState.id == BANK_STATE_ID)
+        .values(version=QuestionBankState.version + 1, updated_at=datetime.utcnow())
+    )
+    if result.rowcount == 0:
+        db.add(QuestionBankState(id=BANK_STATE_ID, version=1))
+
+
+class QuestionIndex:
+    def __init__(self, refresh_seconds: int) -> None:
+        self.refresh_seconds = refresh_seconds
+        self.version = -1
+        self._ids = array("l")
+        self._answer_keys = bytearray()
+        self._facet_ids: dict[tuple[str, object], array] = {}
+        self._facet_members: dict[tuple[str, object], frozenset[int]] = {}
+        # Bitmaps as Python ints (bit n set = question n), for exact random picks.
+        self._present = 0
+        self._facet_bits: dict[tuple[str, object], int] = {}
+        self._checked_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def ensure_fresh(self, db: Session) -> None:
+        now = time.monotonic()
+        if self.version >= 0 and now - self._checked_at < self.refresh_seconds:
+            return
+        # Never wait for another refresher: in MENTORIA_DATABASE_MODE=async this
+        # runs on the event loop thread, where the refresher may be suspended on
+        # the database. Others keep serving the loaded index meanwhile; the
+        # first load happens at startup, so requests never pile up cold reads.
+        refreshing = self._refresh_lock.acquire(blocking=False)
+        if not refreshing:
+            return
+        try:
+            generation = self._generation
+            version = get_bank_version(db)
+            if version != self.version:
+                loaded = self._read(db)
+                with self._lock:
+                    (
+                        self._ids,
+                        self._answer_keys,
+                        self._facet_ids,
+                        self._facet_members,
+                        self._present,
+                        self._facet_bits,
+                    ) = loaded
+                    # An invalidate() during the read keeps the index marked stale.
+                    self.version = version if generation == self._generation else -1
+            self._checked_at = now
+        finally:
+            self._refresh_lock.release()
+
+    @staticmethod
+    def _read(db: Session) -> tuple:
+        ids = array("l")
+        answer_keys = bytearray()
+        facet_ids: dict[tuple[str, object], array] = {}
+        rows = db.execute(
+            select(
+                Question.id,
+                Question.alternativa_correta,
+                Question.ano,
+                Question.disciplina,
+                Question.linguagem,
+            ).order_by(Question.id)
+        )
+        for question_id, alternativa_correta, *facets in rows:
+            ids.append(question_id)
+            if question_id >= len(answer_keys):
+                answer_keys.extend(bytes(question_id + 1 - len(answer_keys)))
+            answer_keys[question_id] = ord(alternativa_correta) if alternativa_correta else _NO_ANSWER_KEY
+            for name, value in zip(FILTER_COLUMNS, facets):
+                if value is not None:
+                    facet_ids.setdefault((name, value), array("l")).append(question_id)
+        facet_members = {key: frozenset(members) for key, members in facet_ids.items()}
+        facet_bits = {key: _bitmap(members) for key, members in facet_ids.items()}
+        return ids, answer_keys, facet_ids, facet_members, _bitmap(ids), facet_bits
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self.version = -1
+
+    def answer_key(self, question_id: int) -> tuple[bool, str | None]:
+        answer_keys = self._answer_keys
+        if question_id < 0 or question_id >= len(answer_keys):
+            return False, None
+        code = answer_keys[question_id]
+        if code == _MISSING:
+            return False, None
+        return True, None if code == _NO_ANSWER_KEY else chr(code)
+
+    def _candidates(self, filters: dict[str, object] | None) -> tuple[array, tuple[frozenset[int], ...]]:
+        if not filters:
+            return self._ids, ()
+        keys = list(filters.items())
+        if any(key not in self._facet_ids for key in keys):
+            return array("l"), ()
+        keys.sort(key=lambda key: len(self._facet_ids[key]))
+        return self._facet_ids[keys[0]], tuple(self._facet_members[key] for key in keys[1:])
+
+    def matches(self, question_id: int, filters: dict[str, object] | None) -> bool:
+        if not filters:
+            return True
+        return all(question_id in self._facet_members.get(key, ()) for key in filters.items())
+
+    def _candidate_bits(self, filters: dict[str, object] | None) -> int:
+        bits = self._present
+        for key in (filters or {}).items():
+            bits &= self._facet_bits.get(key, 0)
+        return bits
+
+    def random_id(self, filters: dict[str, object] | None = None) -> int | None:
+        if not filters:
+            ids = self._ids
+            return ids[randbelow(len(ids))] if ids else None
+        return _random_set_bit(self._candidate_bits(filters))
+
+    def sample_unanswered(
+        self, answered: AnsweredSet, filters: dict[str, object] | None = None, attempts: int = 8
+    ) -> int | None:
+        """Pick uniformly among the candidates ``answered`` does not contain.
+
+        A few random probes settle the usual case; otherwise the pick comes from
+        the candidate bitmap minus the answered bitmap, so the cost depends on
+        the bank size and never on how much the student has answered.
+        """
+        ids, members = self._candidates(filters)
+        if not ids:
+            return None
+        for _ in range(attempts):
+            question_id = ids[randbelow(len(ids))]
+            if question_id not in answered and all(question_id in member for member in members):
+                return question_id
+        return _random_set_bit(self._candidate_bits(filters) & ~answered.bits())
+
+    def stats(self) -> dict[str, int]:
+        return {"version": self.version, "size": len(self._ids)}
+
+
+class RenderedQuestionCache:
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._payloads: OrderedDict[tuple[int, int], bytes] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, question_id: int, version: int) -> bytes | None:
+        key = (question_id, version)
+        with self._lock:
+            payload = self._payloads.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self._payloads.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, question_id: int, version: int, payload: bytes) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._payloads[(question_id, version)] = payload
+            self._payloads.move_to_end((question_id, version))
+            while len(self._payloads) > self.max_size:
+                self._payloads.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"size": len(self._payloads), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+
+question_index = QuestionIndex(refresh_seconds=settings.question_bank_refresh_seconds)
+rendered_questions = RenderedQuestionCache(max_size=settings.question_cache_size)
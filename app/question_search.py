@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from sqlalchemy import Row, func, literal_column, select, text
+from sqlalchemy.orm import Session
+
+from .models import Question
+
+SEARCH_CONFIG = literal_column("'portuguese'::regconfig")
+SEARCH_VECTOR = literal_column("questions.search_vector")
+HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=30, MinWords=10, MaxFragments=2"
+SNIPPET_TOKENS = 24
+
+SQLITE_SEARCH = text(
+    """
+    SELECT q.id, q.titulo, q.ano, q."index", q.disciplina,
+           snippet(questions_fts, -1, '<mark>', '</mark>', '…', :tokens) AS snippet
+    FROM questions_fts
+    JOIN questions AS q ON q.id = questions_fts.rowid
+    WHERE questions_fts MATCH :query
+    ORDER BY bm25(questions_fts, 3.0, 2.0, 1.0)
+    LIMIT :limit
+    """
+)
+
+
+def _postgres_search(db: Session, q: str, limit: int) -> list[Row]:
+    query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    # Rank on the indexed tsvector first; snippets are built only for the
+    # page of winners, inside the database, so no wide row leaves Postgres.
+    ranked = (
+        select(Question.id, func.ts_rank(SEARCH_VECTOR, query).label("rank"))
+        .where(SEARCH_VECTOR.op("@@")(query))
+        .order_by(literal_column("rank").desc())
+        .limit(limit)
+        .subquery()
+    )
+    document = func.concat_ws(
+        " ",
+        Question.contexto,
+        Question.inducaoaalternativa,
+        Question.alternativaA,
+        Question.alternativaB,
+        Question.alternativaC,
+        Question.altenartivaD,
+        Question.alternativaE,
+    )
+    stmt = (
+        select(
+            Question.id,
+            Question.titulo,
+            Question.ano,
+            Question.index,
+            Question.disciplina,
+            func.ts_headline(SEARCH_CONFIG, document, query, HEADLINE_OPTIONS).label("snippet"),
+        )
+        .join(ranked, ranked.c.id == Question.id)
+        .order_by(ranked.c.rank.desc(), Question.id)
+    )
+    return db.execute(stmt).all()
+
+
+def _fts5_query(q: str) -> str:
+    # Quote every term so user input is never parsed as FTS5 syntax.
+    return " ".join('"' + term.replace('"', '""') + '"' for term in q.split())
+
+
+def _sqlite_search(db: Session, q: str, limit: int) -> list[Row]:
+    query = _fts5_query(q)
+    if not query:
+        return []
+    return db.execute(SQLITE_SEARCH, {"query": query, "limit": limit, "tokens": SNIPPET_TOKENS}).all()
+
+
+def search_questions(db: Session, q: str, limit: int) -> list[Row]:
+    if db.get_bind().dialect.name == "sqlite":
+        return _sqlite_search(db, q, limit)
+    return _postgres_search(db, q, limit)
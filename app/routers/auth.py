@@ -1,30 +1,49 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Row, insert, select, update
 from sqlalchemy.orm import Session
 
 from ..database import get_db
 from ..models import Session as SessionModel
 from ..models import Student, Teacher, UserType
-from ..schemas import LoginRequest, SessionInfo, TokenResponse
-from ..security import verify_password
+from ..schemas import LoginRequest, MessageResponse, SessionInfo, TokenResponse
+from ..security import verify_and_update_password
+from ..config import settings
 from ..deps import get_current_session
+from ..session_cache import CachedSession, session_cache
+from ..tokens import issue_signed_token, revoke_signed_token
 
 router = APIRouter(prefix="/auth", tags=["Autenticação"])
 
 
-@router.post("/login", response_model=TokenResponse)
-def login(payload: LoginRequest, db: Session = Depends(get_db)) -> TokenResponse:
-    if payload.user_type == UserType.TEACHER:
-        user = db.query(Teacher).filter(Teacher.email == payload.email, Teacher.is_active.is_(True)).first()
-    else:
-        user = db.query(Student).filter(Student.email == payload.email, Student.is_active.is_(True)).first()
+def _find_user(db: Session, payload: LoginRequest) -> Row | None:
+    model = Teacher if payload.user_type == UserType.TEACHER else Student
+    return db.execute(
+        select(model.id, model.password_hash).where(model.email == payload.email, model.is_active.is_(True))
+    ).first()
 
-    if user is None or not verify_password(payload.password, user.password_hash):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciais inválidas")
 
-    session = SessionModel.build(user_id=user.id, user_type=payload.user_type)
-    db.add(session)
-    db.commit()
-    db.refresh(session)
+def _open_session(db: Session, user: Row, user_type: UserType, new_hash: str | None) -> TokenResponse:
+    if new_hash is not None:
+        model = Teacher if user_type == UserType.TEACHER else Student
+        db.execute(update(model).where(model.id == user.id).values(password_hash=new_hash))
+
+    if settings.token_mode == "signed":
+        session = issue_signed_token(user_id=user.id, user_type=user_type)
+        if new_hash is not None:
+            db.commit()
+    else:
+        session = SessionModel.build(user_id=user.id, user_type=user_type)
+        # Every column is known up front, so a plain INSERT replaces add/commit/refresh.
+        db.execute(
+            insert(SessionModel).values(
+                token=session.token,
+                user_id=session.user_id,
+                user_type=session.user_type,
+                expires_at=session.expires_at,
+            )
+        )
+        db.commit()
 
     return TokenResponse(
         token=session.token,
@@ -34,6 +53,32 @@ def login(payload: LoginRequest, db: Session = Depends(get_db)) -> TokenResponse
     )
 
 
+@router.post("/login", response_model=TokenResponse)
+async def login(payload: LoginRequest, db: Session = Depends(get_db)) -> TokenResponse:
+    # Database work runs in the threadpool; bcrypt runs on the password pool and
+    # is awaited here, so a burst of logins holds no request threads while hashing.
+    user = await run_in_threadpool(_find_user, db, payload)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciais inválidas")
+
+    valid, new_hash = await verify_and_update_password(payload.password, user.password_hash)
+    if not valid:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciais inválidas")
+
+    return await run_in_threadpool(_open_session, db, user, payload.user_type, new_hash)
+
+
 @router.get("/session", response_model=SessionInfo)
-def get_session_info(session: SessionModel = Depends(get_current_session)) -> SessionInfo:
+def get_session_info(session: CachedSession = Depends(get_current_session)) -> SessionInfo:
     return SessionInfo.model_validate(session)
+
+
+@router.post("/logout", response_model=MessageResponse)
+def logout(session: CachedSession = Depends(get_current_session), db: Session = Depends(get_db)) -> MessageResponse:
+    if settings.token_mode == "signed":
+        revoke_signed_token(db, session.token)
+    else:
+        db.query(SessionModel).filter(SessionModel.token == session.token).delete(synchronize_session=False)
+        db.commit()
+        session_cache.invalidate(session.token)
+    return MessageResponse(message="Sessão encerrada com sucesso")
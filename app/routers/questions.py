@@ -1,17 +1,34 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import func
+import re
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from ..answer_buffer import AnswerBufferFull, answer_buffer
+from ..answered_sets import answered_sets
+from ..answers import insert_answers, lookup_answer_keys, normalize_answered_at
+from ..config import settings
 from ..database import get_db
-from ..deps import get_current_student
-from ..models import Question, Respondida
+from ..deps import get_current_student, get_current_user
+from ..live_feed import publish_answers
+from ..models import QUESTION_FULL, Question
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor, set_next_cursor
+from ..question_bank import question_index, rendered_questions
+from ..question_search import search_questions
 from ..schemas import (
+    QuestionAnswerBatchItemResult,
+    QuestionAnswerBatchRequest,
+    QuestionAnswerBatchResult,
     QuestionAnswerRequest,
     QuestionAnswerResult,
     QuestionAlternative,
     QuestionDetail,
+    QuestionListItem,
+    QuestionSearchResult,
 )
 
 router = APIRouter(prefix="/questions", tags=["Questões"])
@@ -47,13 +64,13 @@ def _collect_files(question: Question) -> dict[str, str]:
     return files
 
 
+PLACEHOLDER_PATTERN = re.compile(r"\{\{(\w+)\}\}")
+
+
 def _render_text(text: str | None, files: dict[str, str]) -> str | None:
-    if text is None:
-        return None
-    rendered = text
-    for column, url in files.items():
-        rendered = rendered.replace(f"{{{{{column}}}}}", url)
-    return rendered
+    if text is None or not files:
+        return text
+    return PLACEHOLDER_PATTERN.sub(lambda match: files.get(match.group(1), match.group(0)), text)
 
 
 def _build_question_detail(question: Question) -> QuestionDetail:
@@ -84,45 +101,282 @@ def _build_question_detail(question: Question) -> QuestionDetail:
     )
 
 
-@router.get("/random", response_model=QuestionDetail)
-def get_random_question(
-    student=Depends(get_current_student), db: Session = Depends(get_db)
-) -> QuestionDetail:
-    question = db.query(Question).order_by(func.random()).first()
-    if question is None:
+SelectionStrategy = Literal["random", "unanswered", "review"]
+
+
+def _pick_question_id(
+    db: Session, student_id: int, strategy: SelectionStrategy, filters: dict[str, object]
+) -> int | None:
+    if strategy == "random":
+        return question_index.random_id(filters)
+
+    answered = answered_sets.get(db, student_id)
+    question_id = None
+    if strategy == "review":
+        question_id = answered.random_wrong(lambda candidate: question_index.matches(candidate, filters))
+    if question_id is None:
+        question_id = question_index.sample_unanswered(answered, filters)
+    if question_id is None:
+        question_id = question_index.random_id(filters)
+    return question_id
+
+
+def _question_payload(db: Session, question_id: int) -> bytes | None:
+    version = question_index.version
+    payload = rendered_questions.get(question_id, version)
+    if payload is None:
+        question = db.get(Question, question_id, options=QUESTION_FULL)
+        if question is None:
+            return None
+        payload = _build_question_detail(question).model_dump_json().encode()
+        rendered_questions.put(question_id, version, payload)
+    return payload
+
+
+def _sample_question(
+    db: Session, student_id: int, strategy: SelectionStrategy, filters: dict[str, object]
+) -> bytes | None:
+    question_index.ensure_fresh(db)
+    for _ in range(2):
+        question_id = _pick_question_id(db, student_id, strategy, filters)
+        if question_id is None:
+            return None
+        payload = _question_payload(db, question_id)
+        if payload is not None:
+            return payload
+        question_index.invalidate()
+        question_index.ensure_fresh(db)
+    return None
+
+
+def _question_filters(ano: int | None, disciplina: str | None, linguagem: str | None) -> dict[str, object]:
+    filters = {"ano": ano, "disciplina": disciplina, "linguagem": linguagem}
+    return {name: value for name, value in filters.items() if value is not None}
+
+
+def _list_questions(
+    db: Session, filters: dict[str, object], limit: int, cursor: str | None
+) -> tuple[list[QuestionListItem], str | None]:
+    stmt = select(Question.id, Question.titulo, Question.ano, Question.index, Question.disciplina)
+    for name, value in filters.items():
+        stmt = stmt.where(getattr(Question, name) == value)
+    if cursor is not None:
+        (after_id,) = decode_cursor(cursor, int)
+        stmt = stmt.where(Question.id > after_id)
+    rows = db.execute(stmt.order_by(Question.id).limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].id)
+    return [QuestionListItem.model_validate(row, from_attributes=True) for row in rows], next_cursor
+
+
+# Snippets are cut from the raw text, so a placeholder may carry highlight
+# tags or be truncated where a fragment starts or ends: at either end of the
+# snippet or next to the fragment delimiters ("…" in SQLite, " ... " in
+# Postgres). Only those truncated pieces are dropped.
+SNIPPET_PLACEHOLDER_PATTERN = re.compile(r"\{\{(?:<mark>)?(\w+)(?:</mark>)?\}\}")
+SNIPPET_CUT_START_PATTERN = re.compile(r"(^|…|\.\.\. )[\w<>/]*\}\}\)?")
+SNIPPET_CUT_END_PATTERN = re.compile(r"(?:!\[[^\]]*\]\()?\{\{[\w<>/]*(?=$|…| \.\.\. )")
+
+
+def _render_snippet(snippet: str | None, files: dict[str, str]) -> str | None:
+    if snippet is None:
+        return None
+    snippet = SNIPPET_PLACEHOLDER_PATTERN.sub(lambda match: files.get(match.group(1), match.group(0)), snippet)
+    return SNIPPET_CUT_END_PATTERN.sub("", SNIPPET_CUT_START_PATTERN.sub(r"\1", snippet))
+
+
+def _search(db: Session, q: str, limit: int) -> list[QuestionSearchResult]:
+    rows = search_questions(db, q, limit)
+    files: dict[int, dict[str, str]] = {}
+    with_placeholders = [row.id for row in rows if row.snippet and "{{" in row.snippet]
+    if with_placeholders:
+        file_rows = db.execute(
+            select(Question.id, *(getattr(Question, column) for column in FILE_COLUMNS)).where(
+                Question.id.in_(with_placeholders)
+            )
+        )
+        for question_id, *urls in file_rows:
+            files[question_id] = {column: url for column, url in zip(FILE_COLUMNS, urls) if url}
+    return [
+        QuestionSearchResult(
+            id=row.id,
+            titulo=row.titulo,
+            ano=row.ano,
+            index=row.index,
+            disciplina=row.disciplina,
+            snippet=_render_snippet(row.snippet, files.get(row.id, {})),
+        )
+        for row in rows
+    ]
+
+
+def _random_question(
+    db: Session, student_id: int, strategy: SelectionStrategy, filters: dict[str, object]
+) -> Response:
+    payload = _sample_question(db, student_id, strategy, filters)
+    if payload is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Nenhuma questão disponível")
-    return _build_question_detail(question)
+    return Response(content=payload, media_type="application/json")
 
 
-@router.post("/{question_id}/answer", response_model=QuestionAnswerResult)
-def answer_question(
-    question_id: int,
-    payload: QuestionAnswerRequest,
+@router.get("", response_model=list[QuestionListItem])
+def list_questions(
+    response: Response,
+    ano: int | None = Query(None),
+    disciplina: str | None = Query(None),
+    linguagem: str | None = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(None),
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> list[QuestionListItem]:
+    items, next_cursor = _list_questions(db, _question_filters(ano, disciplina, linguagem), limit, cursor)
+    set_next_cursor(response, next_cursor)
+    return items
+
+
+@router.get("/search", response_model=list[QuestionSearchResult])
+def search(
+    q: str = Query(..., min_length=2, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> list[QuestionSearchResult]:
+    return _search(db, q, limit)
+
+
+@router.get("/random", response_model=QuestionDetail)
+def get_random_question(
+    strategy: SelectionStrategy = Query("unanswered"),
+    ano: int | None = Query(None),
+    disciplina: str | None = Query(None),
+    linguagem: str | None = Query(None),
     student=Depends(get_current_student),
     db: Session = Depends(get_db),
+) -> Response:
+    return _random_question(db, student.id, strategy, _question_filters(ano, disciplina, linguagem))
+
+
+def _answer_question(
+    db: Session, student_id: int, question_id: int, payload: QuestionAnswerRequest
 ) -> QuestionAnswerResult:
-    question = db.get(Question, question_id)
-    if question is None:
+    answer_keys = lookup_answer_keys(db, [question_id])
+    if question_id not in answer_keys:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Questão não encontrada")
+    alternativa_correta = answer_keys[question_id]
 
     alternativa = payload.normalized()
     if alternativa not in ALTERNATIVE_COLUMNS:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Alternativa inválida")
 
-    correta = question.alternativa_correta == alternativa
+    correta = alternativa_correta == alternativa
 
-    resposta = Respondida(
-        student_id=student.id,
-        question_id=question.id,
-        alternativa_escolhida=alternativa,
-        correta=correta,
-    )
-    db.add(resposta)
-    db.commit()
-    db.refresh(resposta)
+    row = {
+        "student_id": student_id,
+        "question_id": question_id,
+        "alternativa_escolhida": alternativa,
+        "correta": correta,
+        "created_at": normalize_answered_at(None),
+    }
+    if settings.answer_write_mode == "buffered" and answer_buffer.running:
+        try:
+            # Never park the event loop on a full buffer in async mode.
+            answer_buffer.put(row, block=settings.database_mode == "sync")
+        except AnswerBufferFull:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Muitas respostas em processamento, tente novamente",
+                headers={"Retry-After": "1"},
+            )
+        answered_sets.record(student_id, question_id, correta)
+        return QuestionAnswerResult(resposta_id=None, correta=correta, alternativa_correta=alternativa_correta)
+
+    try:
+        (resposta_id,) = insert_answers(db, [row])
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        question_index.invalidate()
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Questão não encontrada")
+    answered_sets.record(student_id, question_id, correta)
+    publish_answers([resposta_id], [row])
 
     return QuestionAnswerResult(
-        resposta_id=resposta.id,
+        resposta_id=resposta_id,
         correta=correta,
-        alternativa_correta=question.alternativa_correta,
+        alternativa_correta=alternativa_correta,
     )
+
+
+def _answer_questions_batch(
+    db: Session, student_id: int, payload: QuestionAnswerBatchRequest
+) -> QuestionAnswerBatchResult:
+    answer_keys = lookup_answer_keys(db, (item.question_id for item in payload.answers))
+
+    results: list[QuestionAnswerBatchItemResult] = []
+    rows: list[dict] = []
+    graded: list[QuestionAnswerBatchItemResult] = []
+    for item in payload.answers:
+        if item.question_id not in answer_keys:
+            results.append(QuestionAnswerBatchItemResult(question_id=item.question_id, status="not_found"))
+            continue
+        alternativa = item.normalized()
+        alternativa_correta = answer_keys[item.question_id]
+        correta = alternativa_correta == alternativa
+        result = QuestionAnswerBatchItemResult(
+            question_id=item.question_id,
+            status="ok",
+            correta=correta,
+            alternativa_correta=alternativa_correta,
+        )
+        rows.append(
+            {
+                "student_id": student_id,
+                "question_id": item.question_id,
+                "alternativa_escolhida": alternativa,
+                "correta": correta,
+                "created_at": normalize_answered_at(item.answered_at),
+            }
+        )
+        graded.append(result)
+        results.append(result)
+
+    if rows:
+        try:
+            resposta_ids = insert_answers(db, rows)
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            question_index.invalidate()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Questões alteradas durante o envio, tente novamente",
+            )
+        for result, resposta_id, row in zip(graded, resposta_ids, rows):
+            result.resposta_id = resposta_id
+            answered_sets.record(student_id, row["question_id"], row["correta"])
+        publish_answers(resposta_ids, rows)
+
+    return QuestionAnswerBatchResult(results=results)
+
+
+@router.post("/{question_id}/answer", response_model=QuestionAnswerResult)
+def answer_question(
+    question_id: int,
+    payload: QuestionAnswerRequest,
+    student=Depends(get_current_student),
+    db: Session = Depends(get_db),
+) -> QuestionAnswerResult:
+    return _answer_question(db, student.id, question_id, payload)
+
+
+@router.post("/answers/batch", response_model=QuestionAnswerBatchResult)
+def answer_questions_batch(
+    payload: QuestionAnswerBatchRequest,
+    student=Depends(get_current_student),
+    db: Session = Depends(get_db),
+) -> QuestionAnswerBatchResult:
+    return _answer_questions_batch(db, student.id, payload)
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import get_async_db
+from ..deps import get_current_student_async, get_current_user_async
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, set_next_cursor
+from ..schemas import (
+    QuestionAnswerBatchRequest,
+    QuestionAnswerBatchResult,
+    QuestionAnswerRequest,
+    QuestionAnswerResult,
+    QuestionDetail,
+    QuestionListItem,
+    QuestionSearchResult,
+)
+from .questions import (
+    SelectionStrategy,
+    _answer_question,
+    _answer_questions_batch,
+    _list_questions,
+    _question_filters,
+    _random_question,
+    _search,
+)
+
+# Same routes as routers.questions, served from the event loop. The handlers
+# reuse the sync implementations through AsyncSession.run_sync, so database
+# waits suspend the request instead of holding a threadpool worker.
+router = APIRouter(prefix="/questions", tags=["Questões"])
+
+
+@router.get("", response_model=list[QuestionListItem])
+async def list_questions(
+    response: Response,
+    ano: int | None = Query(None),
+    disciplina: str | None = Query(None),
+    linguagem: str | None = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(None),
+    user=Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+) -> list[QuestionListItem]:
+    filters = _question_filters(ano, disciplina, linguagem)
+    items, next_cursor = await db.run_sync(_list_questions, filters, limit, cursor)
+    set_next_cursor(response, next_cursor)
+    return items
+
+
+@router.get("/search", response_model=list[QuestionSearchResult])
+async def search(
+    q: str = Query(..., min_length=2, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    user=Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+) -> list[QuestionSearchResult]:
+    return await db.run_sync(_search, q, limit)
+
+
+@router.get("/random", response_model=QuestionDetail)
+async def get_random_question(
+    strategy: SelectionStrategy = Query("unanswered"),
+    ano: int | None = Query(None),
+    disciplina: str | None = Query(None),
+    linguagem: str | None = Query(None),
+    student=Depends(get_current_student_async),
+    db: AsyncSession = Depends(get_async_db),
+) -> Response:
+    filters = _question_filters(ano, disciplina, linguagem)
+    return await db.run_sync(_random_question, student.id, strategy, filters)
+
+
+@router.post("/{question_id}/answer", response_model=QuestionAnswerResult)
+async def answer_question(
+    question_id: int,
+    payload: QuestionAnswerRequest,
+    student=Depends(get_current_student_async),
+    db: AsyncSession = Depends(get_async_db),
+) -> QuestionAnswerResult:
+    return await db.run_sync(_answer_question, student.id, question_id, payload)
+
+
+@router.post("/answers/batch", response_model=QuestionAnswerBatchResult)
+async def answer_questions_batch(
+    payload: QuestionAnswerBatchRequest,
+    student=Depends(get_current_student_async),
+    db: AsyncSession = Depends(get_async_db),
+) -> QuestionAnswerBatchResult:
+    return await db.run_sync(_answer_questions_batch, student.id, payload)
@@ -1,91 +1,227 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import csv
+import io
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from ..database import get_db
+from ..database import dialect_insert, get_db
 from ..deps import get_current_student, get_current_teacher
-from ..models import Student, Teacher
+from ..models import Student, Teacher, student_teacher_association
 from ..schemas import (
     MessageResponse,
+    StudentBulkItemResult,
+    StudentBulkResult,
     StudentCreate,
     StudentCreateWithTag,
     StudentOut,
+    StudentPrincipal,
     StudentTagAttachRequest,
+    TeacherPrincipal,
 )
-from ..security import hash_password
+from ..security import hash_password, hash_passwords
 
 router = APIRouter(prefix="/students", tags=["Alunos"])
 
 
-def _ensure_unique_email(db: Session, email: str) -> None:
-    exists = db.query(Student.id).filter(Student.email == email).first()
-    if exists:
+def _active_teacher_id(db: Session, tag: str) -> int:
+    teacher_id = db.scalar(select(Teacher.id).where(Teacher.tag == tag, Teacher.is_active.is_(True)))
+    if teacher_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Professor com esta tag não encontrado")
+    return teacher_id
+
+
+def _create_student(db: Session, payload: StudentCreate, teacher_id: int) -> StudentOut:
+    # The unique email constraint decides duplicates: no pre-check, no refresh.
+    student_id = db.scalar(
+        dialect_insert(db, Student)
+        .values(
+            name=payload.name,
+            email=payload.email,
+            password_hash=hash_password(payload.password),
+            is_active=True,
+        )
+        .on_conflict_do_nothing()
+        .returning(Student.id)
+    )
+    if student_id is None:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email de aluno já cadastrado")
+    db.execute(insert(student_teacher_association).values(student_id=student_id, teacher_id=teacher_id))
+    db.commit()
+    return StudentOut(id=student_id, name=payload.name, email=payload.email)
 
 
 @router.post("/self-register", response_model=StudentOut, status_code=status.HTTP_201_CREATED)
 def student_self_register(payload: StudentCreateWithTag, db: Session = Depends(get_db)) -> StudentOut:
-    teacher = db.query(Teacher).filter(Teacher.tag == payload.teacher_tag, Teacher.is_active.is_(True)).first()
-    if teacher is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Professor com esta tag não encontrado")
-
-    _ensure_unique_email(db, payload.email)
-
-    student = Student(
-        name=payload.name,
-        email=payload.email,
-        password_hash=hash_password(payload.password),
-    )
-    student.teachers.append(teacher)
-
-    db.add(student)
-    db.commit()
-    db.refresh(student)
-
-    return StudentOut.model_validate(student)
+    return _create_student(db, payload, _active_teacher_id(db, payload.teacher_tag))
 
 
 @router.post("", response_model=StudentOut, status_code=status.HTTP_201_CREATED)
 def create_student_for_teacher(
     payload: StudentCreate,
-    teacher: Teacher = Depends(get_current_teacher),
+    teacher: TeacherPrincipal = Depends(get_current_teacher),
     db: Session = Depends(get_db),
 ) -> StudentOut:
-    _ensure_unique_email(db, payload.email)
-
-    student = Student(
-        name=payload.name,
-        email=payload.email,
-        password_hash=hash_password(payload.password),
+    return _create_student(db, payload, teacher.id)
+
+
+MAX_BULK_STUDENTS = 1000
+# About 1 KB per row (name and email are capped at 255 characters each).
+MAX_BULK_BYTES = MAX_BULK_STUDENTS * 1024
+BULK_CSV_COLUMNS = {"name", "email", "password"}
+
+
+def _parse_bulk_rows(content_type: str, body: bytes) -> list[dict]:
+    if content_type.startswith("text/csv"):
+        try:
+            reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+            if reader.fieldnames is None or not BULK_CSV_COLUMNS <= set(reader.fieldnames):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="CSV deve ter as colunas name, email e password",
+                )
+            rows = list(reader)
+        except (UnicodeDecodeError, csv.Error):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="CSV inválido")
+    else:
+        try:
+            rows = json.loads(body)["students"]
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="JSON deve conter a lista students")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="JSON deve conter a lista students")
+
+    if not rows:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nenhum aluno informado")
+    if len(rows) > MAX_BULK_STUDENTS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Máximo de {MAX_BULK_STUDENTS} alunos por envio",
+        )
+    return rows
+
+
+def _validate_bulk_rows(
+    db: Session, rows: list[dict]
+) -> tuple[list[StudentBulkItemResult], list[tuple[StudentBulkItemResult, StudentCreate]]]:
+    results: list[StudentBulkItemResult] = []
+    accepted: list[tuple[StudentBulkItemResult, StudentCreate]] = []
+    seen: set[str] = set()
+    for number, row in enumerate(rows, start=1):
+        try:
+            student = StudentCreate.model_validate(row)
+        except ValidationError as exc:
+            error = exc.errors()[0]
+            field = ".".join(str(part) for part in error["loc"])
+            email = row.get("email") if isinstance(row, dict) else None
+            results.append(
+                StudentBulkItemResult(
+                    row=number,
+                    email=email if isinstance(email, str) else None,
+                    status="invalid",
+                    detail=f"{field}: {error['msg']}" if field else error["msg"],
+                )
+            )
+            continue
+        result = StudentBulkItemResult(row=number, email=student.email, status="created")
+        if student.email in seen:
+            result.status = "duplicate"
+        else:
+            seen.add(student.email)
+            accepted.append((result, student))
+        results.append(result)
+
+    if accepted:
+        existing = set(
+            db.scalars(select(Student.email).where(Student.email.in_([student.email for _, student in accepted])))
+        )
+        for result, student in accepted:
+            if student.email in existing:
+                result.status = "exists"
+        accepted = [(result, student) for result, student in accepted if result.status == "created"]
+    return results, accepted
+
+
+def _insert_bulk_students(
+    db: Session, teacher_id: int, accepted: list[tuple[StudentBulkItemResult, StudentCreate]], hashes: list[str]
+) -> None:
+    try:
+        student_ids = db.scalars(
+            insert(Student).returning(Student.id, sort_by_parameter_order=True),
+            [
+                {"name": student.name, "email": student.email, "password_hash": password_hash, "is_active": True}
+                for (_, student), password_hash in zip(accepted, hashes)
+            ],
+        ).all()
+        db.execute(
+            insert(student_teacher_association),
+            [{"student_id": student_id, "teacher_id": teacher_id} for student_id in student_ids],
+        )
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Emails cadastrados durante o envio, tente novamente",
+        )
+    for (result, _), student_id in zip(accepted, student_ids):
+        result.id = student_id
+
+
+async def _read_bulk_body(request: Request) -> bytes:
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Máximo de {MAX_BULK_STUDENTS} alunos por envio",
     )
-    student.teachers.append(teacher)
-
-    db.add(student)
-    db.commit()
-    db.refresh(student)
-
-    return StudentOut.model_validate(student)
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_BULK_BYTES:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > MAX_BULK_BYTES:
+            raise too_large
+    return bytes(body)
+
+
+@router.post("/bulk", response_model=StudentBulkResult)
+async def create_students_bulk(
+    request: Request,
+    teacher: TeacherPrincipal = Depends(get_current_teacher),
+    db: Session = Depends(get_db),
+) -> StudentBulkResult:
+    rows = _parse_bulk_rows(request.headers.get("content-type", ""), await _read_bulk_body(request))
+    results, accepted = await run_in_threadpool(_validate_bulk_rows, db, rows)
+    if accepted:
+        hashes = await hash_passwords([student.password for _, student in accepted])
+        await run_in_threadpool(_insert_bulk_students, db, teacher.id, accepted, hashes)
+    return StudentBulkResult(created=len(accepted), results=results)
 
 
 @router.post("/me/tags", response_model=MessageResponse)
 def add_teacher_tag(
     payload: StudentTagAttachRequest,
-    student: Student = Depends(get_current_student),
+    student: StudentPrincipal = Depends(get_current_student),
     db: Session = Depends(get_db),
 ) -> MessageResponse:
-    teacher = db.query(Teacher).filter(Teacher.tag == payload.teacher_tag, Teacher.is_active.is_(True)).first()
-    if teacher is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Professor com esta tag não encontrado")
-
-    if teacher in student.teachers:
+    teacher_id = _active_teacher_id(db, payload.teacher_tag)
+    linked = db.scalar(
+        dialect_insert(db, student_teacher_association)
+        .values(student_id=student.id, teacher_id=teacher_id)
+        .on_conflict_do_nothing()
+        .returning(student_teacher_association.c.student_id)
+    )
+    if linked is None:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Tag já vinculada a este aluno")
-
-    student.teachers.append(teacher)
-    db.add(student)
     db.commit()
 
     return MessageResponse(message="Tag de professor adicionada com sucesso")
 
 
 @router.get("/me", response_model=StudentOut)
-def get_profile(student: Student = Depends(get_current_student)) -> StudentOut:
+def get_profile(student: StudentPrincipal = Depends(get_current_student)) -> StudentOut:
     return StudentOut.model_validate(student)
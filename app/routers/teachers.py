@@ -1,81 +1,119 @@
-from secrets import randbelow
+import asyncio
+import csv
+import io
+import json
+import re
+from collections.abc import AsyncIterator, Iterator
+from datetime import datetime
+from typing import Literal
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import Integer, cast, func
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import String, cast, func, literal, literal_column, select, tuple_
+from sqlalchemy.orm import Session
+from sqlalchemy.types import UserDefinedType
 
-from ..database import get_db
+from ..database import SessionLocal, dialect_insert, get_db
 from ..deps import get_current_teacher
-from ..models import Respondida, Teacher, student_teacher_association, Student
+from ..live_feed import answer_hub
+from ..models import Question, Respondida, StudentStats, Teacher, UserType, student_teacher_association, Student
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor, set_next_cursor
 from ..schemas import (
+    ClassAnswerChange,
+    EnrollmentChange,
     MessageResponse,
     StudentAnswerDetail,
     StudentSummary,
+    TeacherChanges,
     TeacherCreate,
     TeacherOut,
+    TeacherPrincipal,
     TeacherTagResponse,
 )
 from ..security import hash_password
+from ..session_cache import session_cache
+from ..teacher_tags import TagsExhausted, allocate_tag
 
 router = APIRouter(prefix="/teachers", tags=["Professores"])
 
 
-def _generate_unique_tag(db: Session) -> str:
-    for _ in range(20):
-        candidate = f"{randbelow(10**4):04d}"
-        exists = db.query(Teacher.id).filter(Teacher.tag == candidate).first()
-        if not exists:
-            return candidate
-    raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Não foi possível gerar tag única")
+def _allocate_tag() -> str:
+    try:
+        return allocate_tag()
+    except TagsExhausted:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Tags de professor esgotadas, aumente MENTORIA_TEACHER_TAG_LENGTH",
+        )
 
 
 @router.post("", response_model=TeacherOut, status_code=status.HTTP_201_CREATED)
 def create_teacher(payload: TeacherCreate, db: Session = Depends(get_db)) -> TeacherOut:
-    already = db.query(Teacher.id).filter(Teacher.email == payload.email).first()
-    if already:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email já cadastrado")
-
-    teacher = Teacher(
-        name=payload.name,
-        institution=payload.institution,
-        email=payload.email,
-        password_hash=hash_password(payload.password),
-        tag=_generate_unique_tag(db),
-    )
+    password_hash = hash_password(payload.password)
+    while True:
+        tag = _allocate_tag()
+        teacher_id = db.scalar(
+            dialect_insert(db, Teacher)
+            .values(
+                name=payload.name,
+                institution=payload.institution,
+                email=payload.email,
+                password_hash=password_hash,
+                tag=tag,
+                is_active=True,
+            )
+            .on_conflict_do_nothing()
+            .returning(Teacher.id)
+        )
+        if teacher_id is not None:
+            break
+        # End the write transaction the conflicting insert opened before the
+        # allocator takes its own connection (SQLite allows a single writer).
+        db.rollback()
+        if db.scalar(select(Teacher.id).where(Teacher.email == payload.email)) is not None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email já cadastrado")
+        # The tag was taken before the allocator existed; move on to the next one.
 
-    db.add(teacher)
     db.commit()
-    db.refresh(teacher)
-    return TeacherOut.model_validate(teacher)
+    return TeacherOut(
+        id=teacher_id, name=payload.name, institution=payload.institution, email=payload.email, tag=tag
+    )
 
 
 @router.get("/me", response_model=TeacherOut)
-def get_profile(teacher: Teacher = Depends(get_current_teacher)) -> TeacherOut:
+def get_profile(teacher: TeacherPrincipal = Depends(get_current_teacher)) -> TeacherOut:
     return TeacherOut.model_validate(teacher)
 
 
 @router.get("/me/tag", response_model=TeacherTagResponse)
-def get_my_tag(teacher: Teacher = Depends(get_current_teacher)) -> TeacherTagResponse:
+def get_my_tag(teacher: TeacherPrincipal = Depends(get_current_teacher)) -> TeacherTagResponse:
     return TeacherTagResponse(tag=teacher.tag)
 
 
 @router.delete("/me", response_model=MessageResponse)
-def deactivate_teacher(teacher: Teacher = Depends(get_current_teacher), db: Session = Depends(get_db)) -> MessageResponse:
-    teacher.is_active = False
-    db.add(teacher)
+def deactivate_teacher(teacher: TeacherPrincipal = Depends(get_current_teacher), db: Session = Depends(get_db)) -> MessageResponse:
+    db.query(Teacher).filter(Teacher.id == teacher.id).update({Teacher.is_active: False}, synchronize_session=False)
     db.commit()
+    session_cache.invalidate_user(teacher.id, UserType.TEACHER)
     return MessageResponse(message="Professor desativado com sucesso")
 
 
 @router.get("/me/students", response_model=list[StudentSummary])
-def list_students(teacher: Teacher = Depends(get_current_teacher), db: Session = Depends(get_db)) -> list[StudentSummary]:
-    stats = (
+def list_students(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(None),
+    teacher: TeacherPrincipal = Depends(get_current_teacher),
+    db: Session = Depends(get_db),
+) -> list[StudentSummary]:
+    query = (
         db.query(
             Student.id,
             Student.name,
             Student.email,
-            func.count(Respondida.id).label("total"),
-            func.coalesce(func.sum(cast(Respondida.correta, Integer)), 0).label("corretas"),
+            func.coalesce(StudentStats.total, 0).label("total"),
+            func.coalesce(StudentStats.corretas, 0).label("corretas"),
+            StudentStats.last_answered_at,
         )
         .join(
             student_teacher_association,
@@ -85,14 +123,19 @@ def list_students(teacher: Teacher = Depends(get_current_teacher), db: Session =
             student_teacher_association.c.teacher_id == teacher.id,
             Student.is_active.is_(True),
         )
-        .outerjoin(Respondida, Respondida.student_id == Student.id)
-        .group_by(Student.id, Student.name, Student.email)
-        .order_by(Student.name)
-        .all()
+        .outerjoin(StudentStats, StudentStats.student_id == Student.id)
     )
+    if cursor is not None:
+        after_name, after_id = decode_cursor(cursor, str, int)
+        query = query.filter(tuple_(Student.name, Student.id) > tuple_(after_name, after_id))
+    stats = query.order_by(Student.name, Student.id).limit(limit + 1).all()
+
+    if len(stats) > limit:
+        stats = stats[:limit]
+        set_next_cursor(response, encode_cursor(stats[-1].name, stats[-1].id))
 
     summaries: list[StudentSummary] = []
-    for student_id, name, email, total, corretas in stats:
+    for student_id, name, email, total, corretas, last_answered_at in stats:
         total_int = int(total)
         corretas_int = int(corretas) if corretas is not None else 0
         erradas = total_int - corretas_int
@@ -104,6 +147,7 @@ def list_students(teacher: Teacher = Depends(get_current_teacher), db: Session =
                 total_respostas=total_int,
                 total_corretas=corretas_int,
                 total_erradas=erradas,
+                last_answered_at=last_answered_at,
             )
         )
     return summaries
@@ -112,7 +156,10 @@ def list_students(teacher: Teacher = Depends(get_current_teacher), db: Session =
 @router.get("/students/{student_id}/answers", response_model=list[StudentAnswerDetail])
 def get_student_answers(
     student_id: int,
-    teacher: Teacher = Depends(get_current_teacher),
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(None),
+    teacher: TeacherPrincipal = Depends(get_current_teacher),
     db: Session = Depends(get_db),
 ) -> list[StudentAnswerDetail]:
     association = (
@@ -129,28 +176,307 @@ def get_student_answers(
             detail="Aluno não encontrado para este professor",
         )
 
-    respostas = (
-        db.query(Respondida)
-        .options(joinedload(Respondida.question))
+    query = (
+        db.query(
+            Respondida.id,
+            Respondida.question_id,
+            Respondida.alternativa_escolhida,
+            Respondida.correta,
+            Respondida.created_at,
+            Question.index,
+            Question.ano,
+            Question.titulo,
+            Question.alternativa_correta,
+        )
+        .outerjoin(Question, Question.id == Respondida.question_id)
         .filter(Respondida.student_id == student_id)
-        .order_by(Respondida.created_at.desc())
-        .all()
     )
+    if cursor is not None:
+        before_created_at, before_id = decode_cursor(cursor, datetime, int)
+        query = query.filter(tuple_(Respondida.created_at, Respondida.id) < tuple_(before_created_at, before_id))
+    respostas = query.order_by(Respondida.created_at.desc(), Respondida.id.desc()).limit(limit + 1).all()
+
+    if len(respostas) > limit:
+        respostas = respostas[:limit]
+        set_next_cursor(response, encode_cursor(respostas[-1].created_at, respostas[-1].id))
 
     details: list[StudentAnswerDetail] = []
     for resposta in respostas:
-        question = resposta.question
+        exists = resposta.titulo is not None
         details.append(
             StudentAnswerDetail(
                 id=resposta.id,
                 question_id=resposta.question_id,
-                question_index=question.index if question else 0,
-                question_year=question.ano if question else 0,
-                question_title=question.titulo if question else "Questão removida",
+                question_index=resposta.index if exists else 0,
+                question_year=resposta.ano if exists else 0,
+                question_title=resposta.titulo if exists else "Questão removida",
                 alternativa_escolhida=resposta.alternativa_escolhida,
-                alternativa_correta=question.alternativa_correta if question else None,
+                alternativa_correta=resposta.alternativa_correta,
                 correta=resposta.correta,
                 responded_at=resposta.created_at,
             )
         )
     return details
+
+
+# The changes cursor must only move past rows that are already committed,
+# and answer ids are not handed out in commit order under concurrent writers.
+# On Postgres every answer and link row records its inserting transaction
+# (txid, see SCHEMA_UPGRADES) and the cursor stores a pg_snapshot: a poll
+# returns exactly the rows that became visible between the previous snapshot
+# and a new one. SQLite runs one writer at a time, so ids (and the rowid of
+# the link table) already follow commit order.
+SNAPSHOT_PATTERN = re.compile(r"^\d+:\d+:(\d+(,\d+)*)?$")
+LINK_ROWID = literal_column("student_teacher_links.rowid")
+
+
+class PgSnapshot(UserDefinedType):
+    cache_ok = True
+
+    def get_col_spec(self, **kw) -> str:
+        return "pg_snapshot"
+
+
+def _uses_snapshots(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _new_rows(txid, lower: str, upper: str) -> list:
+    return [
+        txid >= func.pg_snapshot_xmin(cast(literal(lower, String), PgSnapshot())),
+        ~func.pg_visible_in_snapshot(txid, cast(literal(lower, String), PgSnapshot())),
+        func.pg_visible_in_snapshot(txid, cast(literal(upper, String), PgSnapshot())),
+    ]
+
+
+def _changes_head(db: Session) -> str:
+    if _uses_snapshots(db):
+        return encode_cursor(db.scalar(select(cast(func.pg_current_snapshot(), String))), "", 0, 0)
+    last_answer_id = db.scalar(select(func.max(Respondida.id))) or 0
+    last_link = db.scalar(select(func.max(LINK_ROWID)).select_from(student_teacher_association)) or 0
+    return encode_cursor("", "", last_answer_id, last_link)
+
+
+def _decode_changes_cursor(db: Session, since: str) -> tuple[str, str, int, int]:
+    lower, upper, after_answer, after_link = decode_cursor(since, str, str, int, int)
+    if _uses_snapshots(db):
+        if not SNAPSHOT_PATTERN.match(lower) or (upper and not SNAPSHOT_PATTERN.match(upper)):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido")
+        if not upper:
+            upper = db.scalar(select(cast(func.pg_current_snapshot(), String)))
+    elif lower or upper:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido")
+    return lower, upper, after_answer, after_link
+
+
+@router.get("/me/changes", response_model=TeacherChanges)
+def get_changes(
+    since: str | None = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    teacher: TeacherPrincipal = Depends(get_current_teacher),
+    db: Session = Depends(get_db),
+) -> TeacherChanges:
+    if since is None:
+        return TeacherChanges(cursor=_changes_head(db), has_more=False, answers=[], enrollments=[])
+
+    lower, upper, after_answer, after_link = _decode_changes_cursor(db, since)
+    links = student_teacher_association.c
+    answer_query = (
+        select(
+            Respondida.id,
+            Respondida.student_id,
+            Respondida.question_id,
+            Respondida.alternativa_escolhida,
+            Respondida.correta,
+            Respondida.created_at,
+            Question.index,
+            Question.ano,
+            Question.titulo,
+            Question.alternativa_correta,
+        )
+        .join(student_teacher_association, links.student_id == Respondida.student_id)
+        .outerjoin(Question, Question.id == Respondida.question_id)
+        .where(links.teacher_id == teacher.id, Respondida.id > after_answer)
+        .order_by(Respondida.id)
+        .limit(limit + 1)
+    )
+    if _uses_snapshots(db):
+        # Within one snapshot window the link rows are keyed by student_id.
+        link_key = links.student_id
+        answer_query = answer_query.where(*_new_rows(literal_column("respondidas.txid"), lower, upper))
+        link_filter = _new_rows(literal_column("student_teacher_links.txid"), lower, upper)
+    else:
+        link_key = LINK_ROWID
+        link_filter = []
+    answer_rows = db.execute(answer_query).all()
+
+    enrollment_rows = db.execute(
+        select(Student.id, Student.name, Student.email, links.created_at, link_key.label("link_key"))
+        .join(student_teacher_association, links.student_id == Student.id)
+        .where(links.teacher_id == teacher.id, Student.is_active.is_(True), link_key > after_link, *link_filter)
+        .order_by(link_key)
+        .limit(limit + 1)
+    ).all()
+
+    has_more = len(answer_rows) > limit or len(enrollment_rows) > limit
+    answer_rows = answer_rows[:limit]
+    enrollment_rows = enrollment_rows[:limit]
+    if answer_rows:
+        after_answer = answer_rows[-1].id
+    if enrollment_rows:
+        after_link = enrollment_rows[-1].link_key
+
+    if _uses_snapshots(db):
+        # Page through the current window; once it is drained the next poll
+        # starts a new window from this snapshot.
+        cursor = encode_cursor(lower, upper, after_answer, after_link) if has_more else encode_cursor(upper, "", 0, 0)
+    else:
+        cursor = encode_cursor("", "", after_answer, after_link)
+
+    answers: list[ClassAnswerChange] = []
+    for resposta in answer_rows:
+        exists = resposta.titulo is not None
+        answers.append(
+            ClassAnswerChange(
+                id=resposta.id,
+                student_id=resposta.student_id,
+                question_id=resposta.question_id,
+                question_index=resposta.index if exists else 0,
+                question_year=resposta.ano if exists else 0,
+                question_title=resposta.titulo if exists else "Questão removida",
+                alternativa_escolhida=resposta.alternativa_escolhida,
+                alternativa_correta=resposta.alternativa_correta,
+                correta=resposta.correta,
+                responded_at=resposta.created_at,
+            )
+        )
+    enrollments = [
+        EnrollmentChange(student_id=row.id, name=row.name, email=row.email, linked_at=row.created_at)
+        for row in enrollment_rows
+    ]
+    return TeacherChanges(cursor=cursor, has_more=has_more, answers=answers, enrollments=enrollments)
+
+
+EXPORT_COLUMNS = [
+    "student_id",
+    "student_name",
+    "student_email",
+    "resposta_id",
+    "question_id",
+    "question_index",
+    "question_year",
+    "question_title",
+    "alternativa_escolhida",
+    "alternativa_correta",
+    "correta",
+    "responded_at",
+]
+EXPORT_BATCH_SIZE = 1000
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+def _class_answers_query(teacher_id: int):
+    return (
+        select(
+            Student.id,
+            Student.name,
+            Student.email,
+            Respondida.id,
+            Respondida.question_id,
+            Question.index,
+            Question.ano,
+            Question.titulo,
+            Respondida.alternativa_escolhida,
+            Question.alternativa_correta,
+            Respondida.correta,
+            Respondida.created_at,
+        )
+        .join(student_teacher_association, Student.id == student_teacher_association.c.student_id)
+        .join(Respondida, Respondida.student_id == Student.id)
+        .outerjoin(Question, Question.id == Respondida.question_id)
+        .where(student_teacher_association.c.teacher_id == teacher_id, Student.is_active.is_(True))
+        .order_by(Student.id, Respondida.created_at, Respondida.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+
+def _format_ndjson(rows) -> str:
+    lines = []
+    for row in rows:
+        record = dict(zip(EXPORT_COLUMNS, row))
+        record["responded_at"] = record["responded_at"].isoformat()
+        lines.append(json.dumps(record, ensure_ascii=False))
+    return "\n".join(lines) + "\n"
+
+
+def _format_csv(rows) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+    return buffer.getvalue()
+
+
+def _stream_class_answers(teacher_id: int, export_format: str) -> Iterator[str]:
+    # The request-scoped session is closed before a streaming body is sent,
+    # so the export holds its own session for the lifetime of the cursor.
+    formatter = _format_csv if export_format == "csv" else _format_ndjson
+    if export_format == "csv":
+        yield _format_csv([EXPORT_COLUMNS])
+    with SessionLocal() as db:
+        result = db.execute(_class_answers_query(teacher_id))
+        for rows in result.partitions():
+            yield formatter(rows)
+
+
+@router.get("/me/answers/export")
+def export_class_answers(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    teacher: TeacherPrincipal = Depends(get_current_teacher),
+) -> StreamingResponse:
+    return StreamingResponse(
+        _stream_class_answers(teacher.id, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="respostas.{export_format}"'},
+    )
+
+
+LIVE_KEEPALIVE_SECONDS = 15
+
+
+async def _stream_live_answers(request: Request, student_ids: list[int]) -> AsyncIterator[str]:
+    subscription = answer_hub.subscribe(student_ids)
+    try:
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=LIVE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if event is None:
+                yield "event: overflow\ndata: {}\n\n"
+                return
+            yield f"event: answer\nid: {event['id']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        answer_hub.unsubscribe(subscription)
+
+
+@router.get("/me/answers/live")
+def live_answers(
+    request: Request,
+    teacher: TeacherPrincipal = Depends(get_current_teacher),
+    db: Session = Depends(get_db),
+) -> StreamingResponse:
+    student_ids = list(
+        db.execute(
+            select(student_teacher_association.c.student_id).where(
+                student_teacher_association.c.teacher_id == teacher.id
+            )
+        ).scalars()
+    )
+    return StreamingResponse(
+        _stream_live_answers(request, student_ids),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
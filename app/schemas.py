@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic import BaseModel, EmailStr, Field
 
@@ -37,6 +37,19 @@ class StudentCreateWithTag(StudentCreate):
     teacher_tag: str = Field(..., max_length=32)
 
 
+class StudentBulkItemResult(BaseModel):
+    row: int
+    email: str | None = None
+    status: Literal["created", "exists", "duplicate", "invalid"]
+    id: int | None = None
+    detail: str | None = None
+
+
+class StudentBulkResult(BaseModel):
+    created: int
+    results: list[StudentBulkItemResult]
+
+
 class StudentOut(StudentBase):
     id: int
 
@@ -85,6 +98,30 @@ class CurrentUser(BaseModel):
     user_type: UserType
 
 
+class StudentPrincipal(CurrentUser):
+    name: str
+    email: str
+
+
+class TeacherPrincipal(CurrentUser):
+    name: str
+    institution: str
+    email: str
+    tag: str
+
+
+class QuestionListItem(BaseModel):
+    id: int
+    titulo: str
+    ano: int
+    index: int
+    disciplina: str | None
+
+
+class QuestionSearchResult(QuestionListItem):
+    snippet: str | None
+
+
 class QuestionFile(BaseModel):
     column: str
     url: str
@@ -119,11 +156,32 @@ class QuestionAnswerRequest(BaseModel):
 
 
 class QuestionAnswerResult(BaseModel):
-    resposta_id: int
+    resposta_id: int | None
     correta: bool
     alternativa_correta: str | None
 
 
+class QuestionAnswerBatchItem(QuestionAnswerRequest):
+    question_id: int
+    answered_at: datetime | None = None
+
+
+class QuestionAnswerBatchRequest(BaseModel):
+    answers: list[QuestionAnswerBatchItem] = Field(..., min_length=1, max_length=500)
+
+
+class QuestionAnswerBatchItemResult(BaseModel):
+    question_id: int
+    status: Literal["ok", "not_found"]
+    resposta_id: int | None = None
+    correta: bool | None = None
+    alternativa_correta: str | None = None
+
+
+class QuestionAnswerBatchResult(BaseModel):
+    results: list[QuestionAnswerBatchItemResult]
+
+
 class StudentSummary(BaseModel):
     id: int
     name: str
@@ -131,6 +189,7 @@ class StudentSummary(BaseModel):
     total_respostas: int
     total_corretas: int
     total_erradas: int
+    last_answered_at: datetime | None = None
 
 
 class StudentAnswerDetail(BaseModel):
@@ -143,3 +202,21 @@ class StudentAnswerDetail(BaseModel):
     alternativa_correta: str | None
     correta: bool
     responded_at: datetime
+
+
+class ClassAnswerChange(StudentAnswerDetail):
+    student_id: int
+
+
+class EnrollmentChange(BaseModel):
+    student_id: int
+    name: str
+    email: EmailStr
+    linked_at: datetime
+
+
+class TeacherChanges(BaseModel):
+    cursor: str
+    has_more: bool
+    answers: list[ClassAnswerChange]
+    enrollments: list[EnrollmentChange]
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from .config import settings
+from .models import UserType
+
+
+@dataclass(frozen=True, slots=True)
+class CachedSession:
+    token: str
+    user_id: int
+    user_type: UserType
+    created_at: datetime
+    expires_at: datetime
+
+
+@dataclass(slots=True)
+class _Entry:
+    session: CachedSession | None
+    valid_until: datetime
+
+
+class SessionCache:
+    def __init__(self, max_size: int, ttl_seconds: int, negative_ttl_seconds: int) -> None:
+        self.max_size = max_size
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.negative_ttl = timedelta(seconds=negative_ttl_seconds)
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, token: str) -> tuple[bool, CachedSession | None]:
+        now = datetime.utcnow()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            if entry.valid_until <= now:
+                del self._entries[token]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(token)
+            if entry.session is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return True, entry.session
+
+    def put(self, session: CachedSession) -> None:
+        valid_until = min(datetime.utcnow() + self.ttl, session.expires_at)
+        self._store(session.token, _Entry(session=session, valid_until=valid_until))
+
+    def put_missing(self, token: str) -> None:
+        if self.negative_ttl <= timedelta(0):
+            return
+        self._store(token, _Entry(session=None, valid_until=datetime.utcnow() + self.negative_ttl))
+
+    def _store(self, token: str, entry: _Entry) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[token] = entry
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, token: str) -> None:
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def invalidate_user(self, user_id: int, user_type: UserType) -> None:
+        with self._lock:
+            stale = [
+                token
+                for token, entry in self._entries.items()
+                if entry.session is not None
+                and entry.session.user_id == user_id
+                and entry.session.user_type == user_type
+            ]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+session_cache = SessionCache(
+    max_size=settings.session_cache_size,
+    ttl_seconds=settings.session_cache_ttl_seconds,
+    negative_ttl_seconds=settings.session_cache_negative_ttl_seconds,
+)
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+from .config import settings
+from .database import engine
+from .models import TeacherTagCounter
+
+# Affine permutation of [0, 10**length): the multiplier is coprime with every
+# power of ten, so consecutive counter values map to distinct, scattered tags.
+TAG_MULTIPLIER = 7_919
+TAG_OFFSET = 4_271
+
+
+class TagsExhausted(Exception):
+    pass
+
+
+def permute(value: int, length: int) -> str:
+    size = 10**length
+    return f"{(value * TAG_MULTIPLIER + TAG_OFFSET) % size:0{length}d}"
+
+
+def _advance(length: int) -> int | None:
+    # Own short transaction, so the counter row is not locked for the length
+    # of the caller's transaction and a rolled-back insert does not reuse a tag.
+    stmt = (
+        update(TeacherTagCounter)
+        .where(TeacherTagCounter.length == length)
+        .values(next_value=TeacherTagCounter.next_value + 1)
+        .returning(TeacherTagCounter.next_value)
+    )
+    with engine.begin() as connection:
+        return connection.execute(stmt).scalar()
+
+
+def allocate_tag(length: int | None = None) -> str:
+    """Hand out the next free tag of ``length`` digits with one atomic UPDATE ... RETURNING.
+
+    Each length has its own counter, so raising ``teacher_tag_length`` opens
+    a new namespace without touching existing tags.
+    """
+    length = length or settings.teacher_tag_length
+    value = _advance(length)
+    if value is None:
+        try:
+            with engine.begin() as connection:
+                connection.execute(insert(TeacherTagCounter).values(length=length, next_value=0))
+        except IntegrityError:
+            pass
+        value = _advance(length)
+    if value > 10**length:
+        raise TagsExhausted(length)
+    return permute(value - 1, length)
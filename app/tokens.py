@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from secrets import token_urlsafe
+
+from jose import JWTError, jwt
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import RevokedToken, UserType
+from .session_cache import CachedSession
+
+
+def _secret_key() -> str:
+    if not settings.token_secret_key:
+        raise RuntimeError("MENTORIA_TOKEN_SECRET_KEY é obrigatória quando MENTORIA_TOKEN_MODE=signed")
+    return settings.token_secret_key
+
+
+def _epoch(value: datetime) -> int:
+    return int(value.replace(tzinfo=timezone.utc).timestamp())
+
+
+def issue_signed_token(user_id: int, user_type: UserType) -> CachedSession:
+    created_at = datetime.utcnow().replace(microsecond=0)
+    expires_at = created_at + timedelta(minutes=settings.access_token_ttl_minutes)
+    claims = {
+        "sub": str(user_id),
+        "typ": user_type.value,
+        "iat": _epoch(created_at),
+        "exp": _epoch(expires_at),
+        "jti": token_urlsafe(16),
+    }
+    token = jwt.encode(claims, _secret_key(), algorithm=settings.token_algorithm)
+    return CachedSession(
+        token=token,
+        user_id=user_id,
+        user_type=user_type,
+        created_at=created_at,
+        expires_at=expires_at,
+    )
+
+
+def _decode(token: str) -> dict | None:
+    try:
+        claims = jwt.decode(token, _secret_key(), algorithms=[settings.token_algorithm])
+    except JWTError:
+        return None
+    if not {"sub", "typ", "jti", "iat"} <= claims.keys() or claims["typ"] not in {t.value for t in UserType}:
+        return None
+    if not str(claims["sub"]).isdigit():
+        return None
+    return claims
+
+
+class RevocationList:
+    def __init__(self, refresh_seconds: int) -> None:
+        self.refresh_seconds = refresh_seconds
+        self._revoked: dict[str, datetime] = {}
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _refresh(self, db: Session) -> None:
+        now = time.monotonic()
+        if now - self._last_refresh < self.refresh_seconds:
+            return
+        # The query runs outside _lock and nobody waits for a refresher in
+        # flight, so this is safe on the event loop thread in async mode.
+        refreshing = self._refresh_lock.acquire(blocking=False)
+        if not refreshing and self._last_refresh:
+            return
+        try:
+            # Ids are assigned at insert, not at commit, so an "id > last seen"
+            # cursor can skip a revocation that commits late. The table only
+            # holds unexpired tokens, so every refresh reloads all of them;
+            # revocations are never undone, so merging is enough.
+            utcnow = datetime.utcnow()
+            rows = db.execute(
+                select(RevokedToken.jti, RevokedToken.expires_at).where(RevokedToken.expires_at >= utcnow)
+            ).all()
+            with self._lock:
+                for row in rows:
+                    self._revoked[row.jti] = row.expires_at
+                for jti in [jti for jti, expires_at in self._revoked.items() if expires_at < utcnow]:
+                    del self._revoked[jti]
+                self._last_refresh = now
+        finally:
+            if refreshing:
+                self._refresh_lock.release()
+
+    def is_revoked(self, db: Session, jti: str) -> bool:
+        self._refresh(db)
+        return jti in self._revoked
+
+    def revoke(self, db: Session, jti: str, expires_at: datetime) -> None:
+        db.execute(delete(RevokedToken).where(RevokedToken.expires_at < datetime.utcnow()))
+        db.add(RevokedToken(jti=jti, expires_at=expires_at))
+        db.commit()
+        with self._lock:
+            self._revoked[jti] = expires_at
+
+
+revocation_list = RevocationList(refresh_seconds=settings.token_revocation_refresh_seconds)
+
+
+def authenticate_signed_token(db: Session, token: str) -> CachedSession | None:
+    claims = _decode(token)
+    if claims is None or revocation_list.is_revoked(db, claims["jti"]):
+        return None
+    return CachedSession(
+        token=token,
+        user_id=int(claims["sub"]),
+        user_type=UserType(claims["typ"]),
+        created_at=datetime.utcfromtimestamp(claims["iat"]),
+        expires_at=datetime.utcfromtimestamp(claims["exp"]),
+    )
+
+
+def revoke_signed_token(db: Session, token: str) -> None:
+    claims = _decode(token)
+    if claims is None:
+        return
+    revocation_list.revoke(db, claims["jti"], datetime.utcfromtimestamp(claims["exp"]))
@@ -1,17 +1,27 @@
 from __future__ import annotations
 
+import argparse
+import hashlib
 import json
-from dataclasses import dataclass
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
 from pathlib import Path
 from typing import Iterator
 
-from sqlalchemy import select
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
-from app.database import Base, SessionLocal, engine
-from app.models import Question
+from app.database import SessionLocal, upgrade_schema
+from app.models import QUESTION_SUMMARY, Question, QuestionImportManifest
+from app.question_bank import bump_bank_version
 
 PUBLIC_DIR = Path(__file__).resolve().parents[1] / "public"
+CHECKPOINT_PATH = Path(__file__).resolve().with_suffix(".checkpoint.json")
 SUPPORTED_FILE_COLUMNS = [
     "aquivo1",
     "arquivo2",
@@ -26,6 +36,22 @@ SUPPORTED_FILE_COLUMNS = [
 ]
 
 
+@dataclass
+class ManifestEntry:
+    source: str
+    ano: int
+    index: int
+    content_hash: str
+
+
+@dataclass
+class ScanResult:
+    pending: list[tuple[Path, str, str, bool]] = field(default_factory=list)
+    unchanged_keys: set[tuple[int, int]] = field(default_factory=set)
+    vanished: list = field(default_factory=list)
+    resumed: int = 0
+
+
 @dataclass
 class QuestionPayload:
     titulo: str
@@ -128,7 +154,11 @@ def _iter_detail_files() -> Iterator[Path]:
 
 
 def upsert_question(session: Session, payload: QuestionPayload) -> None:
-    stmt = select(Question).where(Question.ano == payload.ano, Question.index == payload.index)
+    stmt = (
+        select(Question)
+        .options(*QUESTION_SUMMARY)
+        .where(Question.ano == payload.ano, Question.index == payload.index)
+    )
     result = session.execute(stmt).scalar_one_or_none()
 
     arquivos = payload.arquivos
@@ -187,27 +217,245 @@ def upsert_question(session: Session, payload: QuestionPayload) -> None:
         result.alternativaE = alternativas.get("E")
 
 
+def _question_row(payload: QuestionPayload) -> dict:
+    alternativas = payload.alternativas
+    return {
+        "titulo": payload.titulo,
+        "index": payload.index,
+        "ano": payload.ano,
+        "linguagem": payload.linguagem,
+        "disciplina": payload.disciplina,
+        "contexto": payload.contexto,
+        **payload.arquivos,
+        "alternativa_correta": payload.alternativa_correta,
+        "inducaoaalternativa": payload.inducao,
+        "alternativaA": alternativas.get("A"),
+        "alternativaB": alternativas.get("B"),
+        "alternativaC": alternativas.get("C"),
+        "altenartivaD": alternativas.get("D"),
+        "alternativaE": alternativas.get("E"),
+    }
+
+
+def _insert_for(session: Session, model):
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return pg_insert(model)
+    if dialect == "sqlite":
+        return sqlite_insert(model)
+    return None
+
+
+def upsert_questions(session: Session, payloads: list[QuestionPayload]) -> None:
+    # Last payload wins when a chunk repeats (ano, index): ON CONFLICT cannot
+    # touch the same row twice in one statement.
+    rows = list({(payload.ano, payload.index): _question_row(payload) for payload in payloads}.values())
+    if not rows:
+        return
+
+    stmt = _insert_for(session, Question)
+    if stmt is None:
+        for payload in payloads:
+            upsert_question(session, payload)
+        return
+
+    updated = {column: stmt.excluded[column] for column in rows[0] if column not in {"ano", "index"}}
+    session.execute(stmt.on_conflict_do_update(index_elements=["ano", "index"], set_=updated), rows)
+
+
+def record_manifest(session: Session, entries: list[ManifestEntry]) -> None:
+    if not entries:
+        return
+    now = datetime.utcnow()
+    rows = [
+        {
+            "source": entry.source,
+            "ano": entry.ano,
+            "index": entry.index,
+            "content_hash": entry.content_hash,
+            "imported_at": now,
+        }
+        for entry in entries
+    ]
+    stmt = _insert_for(session, QuestionImportManifest)
+    if stmt is None:
+        for row in rows:
+            session.merge(QuestionImportManifest(**row))
+        return
+    updated = {column: stmt.excluded[column] for column in ("ano", "index", "content_hash", "imported_at")}
+    session.execute(stmt.on_conflict_do_update(index_elements=["source"], set_=updated), rows)
+
+
+def _content_hash(path: Path) -> str:
+    return hashlib.blake2b(path.read_bytes(), digest_size=32).hexdigest()
+
+
+def _source_key(path: Path) -> str:
+    return path.parent.relative_to(PUBLIC_DIR).as_posix()
+
+
+def _checkpoint_key(source: str) -> tuple[str, str]:
+    parts = source.split("/")
+    return parts[0], parts[-1]
+
+
+def _load_checkpoint(path: Path) -> tuple[str, str] | None:
+    if not path.exists():
+        return None
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return data["year_dir"], data["question_dir"]
+
+
+def _save_checkpoint(path: Path, key: tuple[str, str]) -> None:
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps({"year_dir": key[0], "question_dir": key[1]}), encoding="utf-8")
+    tmp_path.replace(path)
+
+
+def _scan(session: Session, full: bool, resume_after: tuple[str, str] | None = None) -> ScanResult:
+    manifest = {
+        row.source: row
+        for row in session.execute(
+            select(
+                QuestionImportManifest.source,
+                QuestionImportManifest.ano,
+                QuestionImportManifest.index,
+                QuestionImportManifest.content_hash,
+            )
+        )
+    }
+    scan = ScanResult()
+    for detail_path in _iter_detail_files():
+        source = _source_key(detail_path)
+        known = manifest.pop(source, None)
+        if resume_after is not None and _checkpoint_key(source) <= resume_after:
+            # Committed by the interrupted run, so its manifest row is current.
+            scan.resumed += 1
+            if known is not None:
+                scan.unchanged_keys.add((known.ano, known.index))
+            continue
+        content_hash = _content_hash(detail_path)
+        if known is not None and known.content_hash == content_hash and not full:
+            scan.unchanged_keys.add((known.ano, known.index))
+            continue
+        scan.pending.append((detail_path, source, content_hash, known is None))
+    scan.vanished = list(manifest.values())
+    return scan
+
+
+def _parse_entry(item: tuple[Path, str, str, bool]) -> tuple[QuestionPayload, ManifestEntry, bool]:
+    detail_path, source, content_hash, is_new = item
+    payload = _extract_question_payload(detail_path)
+    return payload, ManifestEntry(source, payload.ano, payload.index, content_hash), is_new
+
+
+def _iter_payload_chunks(
+    pending: list[tuple[Path, str, str, bool]], workers: int, chunk_size: int
+) -> Iterator[list[tuple[QuestionPayload, ManifestEntry, bool]]]:
+    slices = [pending[start : start + chunk_size] for start in range(0, len(pending), chunk_size)]
+    if not slices:
+        return
+    map_chunksize = max(1, chunk_size // (workers or 1))
+    # At most two chunks are in flight, the one being written and the next one
+    # being parsed, so memory does not grow with the size of the bank.
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        upcoming = pool.map(_parse_entry, slices[0], chunksize=map_chunksize)
+        for position in range(len(slices)):
+            current = upcoming
+            if position + 1 < len(slices):
+                upcoming = pool.map(_parse_entry, slices[position + 1], chunksize=map_chunksize)
+            yield list(current)
+
+
+def delete_vanished(session: Session, vanished: list, present_keys: set[tuple[int, int]]) -> int:
+    removed_keys = {(row.ano, row.index) for row in vanished} - present_keys
+    if removed_keys:
+        session.execute(delete(Question).where(tuple_(Question.ano, Question.index).in_(removed_keys)))
+    session.execute(
+        delete(QuestionImportManifest).where(QuestionImportManifest.source.in_([row.source for row in vanished]))
+    )
+    return len(removed_keys)
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Importa as questões da pasta public para o banco.")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, help="Processos usados na leitura dos arquivos."
+    )
+    parser.add_argument("--chunk-size", type=int, default=500, help="Questões gravadas por comando INSERT.")
+    parser.add_argument("--full", action="store_true", help="Regrava todas as questões, mesmo as que não mudaram.")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continua uma importação interrompida a partir do último lote gravado.",
+    )
+    parser.add_argument(
+        "--checkpoint", type=Path, default=CHECKPOINT_PATH, help="Arquivo que registra o último lote gravado."
+    )
+    parser.add_argument(
+        "--delete-missing",
+        action="store_true",
+        help="Remove questões cujo details.json não existe mais (apaga também as respostas a elas).",
+    )
+    return parser.parse_args()
+
+
 def main() -> None:
-    Base.metadata.create_all(bind=engine)
+    args = _parse_args()
+    upgrade_schema()
 
-    processed = 0
+    added = 0
+    changed = 0
+    deleted = 0
     skipped_overflow = 0
+    started = time.perf_counter()
 
+    resume_after = _load_checkpoint(args.checkpoint) if args.resume else None
     with SessionLocal() as session:
-        for detail_path in _iter_detail_files():
-            payload = _extract_question_payload(detail_path)
-            if payload.overflow_count > 0:
-                skipped_overflow += 1
-            upsert_question(session, payload)
-            processed += 1
+        scan = _scan(session, args.full, resume_after)
+
+    present_keys = set(scan.unchanged_keys)
+    for chunk in _iter_payload_chunks(scan.pending, args.workers, args.chunk_size):
+        payloads = [payload for payload, _, _ in chunk]
+        entries = [entry for _, entry, _ in chunk]
+        # One short-lived session per chunk: the identity map never outlives a
+        # commit, and a crash loses only the chunk in progress.
+        with SessionLocal() as session:
+            upsert_questions(session, payloads)
+            record_manifest(session, entries)
+            session.commit()
+            session.expunge_all()
+        _save_checkpoint(args.checkpoint, _checkpoint_key(entries[-1].source))
+        skipped_overflow += sum(1 for payload in payloads if payload.overflow_count > 0)
+        present_keys.update((payload.ano, payload.index) for payload in payloads)
+        added += sum(1 for _, _, is_new in chunk if is_new)
+        changed += sum(1 for _, _, is_new in chunk if not is_new)
+
+    with SessionLocal() as session:
+        if scan.vanished and args.delete_missing:
+            deleted = delete_vanished(session, scan.vanished, present_keys)
+        # A resumed run cannot tell whether the interrupted one changed
+        # anything, so it always publishes a new bank version.
+        if added or changed or deleted or resume_after is not None:
+            bump_bank_version(session)
         session.commit()
+    args.checkpoint.unlink(missing_ok=True)
 
+    processed = added + changed
+    unchanged = len(scan.unchanged_keys)
+    elapsed = time.perf_counter() - started
     print(
         f"Importação concluída. Questões processadas: {processed}. "
         f"Registros com mais de {len(SUPPORTED_FILE_COLUMNS)} arquivos: {skipped_overflow}."
     )
+    print(
+        f"Novas: {added}. Alteradas: {changed}. Sem alteração: {unchanged}. "
+        f"Removidas: {deleted}. Ausentes mantidas: {0 if args.delete_missing else len(scan.vanished)}. "
+        f"Retomadas do checkpoint: {scan.resumed}."
+    )
+    throughput = processed / elapsed if elapsed else 0
+    print(f"Tempo total: {elapsed:.2f}s ({throughput:.0f} questões/s, {args.workers} processos).")
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from app.answers import rebuild_student_stats
+from app.database import Base, SessionLocal, engine
+
+
+def main() -> None:
+    Base.metadata.create_all(bind=engine)
+
+    with SessionLocal() as session:
+        students = rebuild_student_stats(session)
+        session.commit()
+
+    print(f"Estatísticas recalculadas. Alunos com respostas: {students}.")
+
+
+if __name__ == "__main__":
+    main()